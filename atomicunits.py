@@ -1,5 +1,11 @@
 import numpy as np
-import scipy.constants as constants
+from units import (HARTREE_IN_EV, HARTREE_IN_J, BOHR_IN_NM, BOHR_IN_M, POLARIZATION_IN_UC_PER_CM2,
+                   E_FIELD_IN_MV_PER_CM, DENSITY_IN_PER_M3, CURRENT_DENSITY_IN_UA_PER_UM2)
+
+# SI constants (CODATA 2022, as in scipy.constants), resolved once so that importing the physics core does not need scipy
+EV_TO_JOULE = 1.602176634e-19
+EPSILON_0 = 8.8541878188e-12
+ELEMENTARY_CHARGE = 1.602176634e-19
 
 
 class AtomicUnits:
@@ -8,71 +14,71 @@ class AtomicUnits:
 
     @staticmethod
     def ev_to_hartree(energy):
-        return energy / 27.21138624598853
+        return energy / HARTREE_IN_EV
 
     @staticmethod
     def hartree_to_ev(energy):
-        return energy * 27.21138624598853
+        return energy * HARTREE_IN_EV
 
     @staticmethod
     def nm_to_bohr(length):
-        return length / 5.2917721090380e-2
+        return length / BOHR_IN_NM
 
     @staticmethod
     def bohr_to_nm(length):
-        return length * 5.2917721090380e-2
+        return length * BOHR_IN_NM
 
     @staticmethod
     def m_to_bohr(length):
-        return length / 5.2917721090380e-11
+        return length / BOHR_IN_M
 
     @staticmethod
     def bohr_to_m(length):
-        return length * 5.2917721090380e-11
+        return length * BOHR_IN_M
 
     @staticmethod
     def convert_volts(v):
-        return v / 27.21138624598853
+        return v / HARTREE_IN_EV
 
     @staticmethod
     def convert_back_volts(v):
-        return v * 27.21138624598853
+        return v * HARTREE_IN_EV
 
     @staticmethod
     def convert_polarization(p):  # p in uC/cm^2
-        return p / 1.602176634e-13 * 5.291772109038e-9 ** 2
+        return p / POLARIZATION_IN_UC_PER_CM2
 
     @staticmethod
     def convert_back_polarization(p):
-        return p * 1.602176634e-13 / 5.291772109038e-9 ** 2
+        return p * POLARIZATION_IN_UC_PER_CM2
 
     @staticmethod
     def convert_current_density(j):  # atomic units to uA/um^2
-        return j * 6.62361823751013e3 / 5.291772109038e-5 ** 2
+        return j * CURRENT_DENSITY_IN_UA_PER_UM2
 
     @staticmethod
     def convert_density(d):  # m^-3 to atomic units
-        return d * 5.2917721090380e-11 ** 3
+        return d / DENSITY_IN_PER_M3
 
     @staticmethod
     def convert_back_density(d):
-        return d / 5.2917721090380e-11 ** 3
+        return d * DENSITY_IN_PER_M3
 
     @staticmethod
     def hartree_to_joule(e):
-        return e * 4.359744722207185e-18
+        return e * HARTREE_IN_J
 
     @staticmethod
     def joule_to_hartree(e):
-        return e / 4.359744722207185e-18
+        return e / HARTREE_IN_J
 
     @staticmethod
     def joule_to_ev(e):
-        return e / (constants.physical_constants["electron volt-joule relationship"][0])
+        return e / EV_TO_JOULE
 
     @staticmethod
     def ev_to_joule(e):
-        return e * (constants.physical_constants["electron volt-joule relationship"][0])
+        return e * EV_TO_JOULE
 
     @staticmethod
     def uc_per_cm2_to_c_per_m2(p):
@@ -80,8 +86,8 @@ class AtomicUnits:
 
     @staticmethod
     def Mv_per_cm_to_atomic_units(e):
-        return e / (5.1422067476378 * 10 ** 3)
+        return e / E_FIELD_IN_MV_PER_CM
 
     @staticmethod
     def atomic_units_to_Mv_per_cm(e):
-        return e * (5.1422067476378 * 10 ** 3)
+        return e * E_FIELD_IN_MV_PER_CM
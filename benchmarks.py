@@ -0,0 +1,271 @@
+"""
+Benchmarks of the domain, potential and solver hot paths.
+
+    python benchmarks.py                    # run and compare against benchmark_baseline.json if it exists
+    python benchmarks.py --save-baseline    # run and store the results as the new baseline
+    python benchmarks.py --quick            # smaller sizes, for a fast check
+    python benchmarks.py --imports-only     # only check the import time budget of the physics core
+
+Each benchmark reports wall time (best of --repeat runs), throughput and peak traced memory. A benchmark regresses
+when its throughput falls more than --tolerance below the baseline, in which case the exit status is 1. The exit
+status is also 1 if importing the physics core in a fresh interpreter loads matplotlib or scipy, or takes longer than
+--import-budget seconds, or if BracketingStrategy with a zero threshold no longer reproduces exact quasi-static
+switching (bracketing_check).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from atomicunits import AtomicUnits
+from fed import FerroelectricDiode
+from materials import Materials
+from potential import Potential
+from preisach import Ferroelectric
+from self_consistent_solver import SelfConsistentSolver, BracketingStrategy
+
+CORE_MODULES = ("atomicunits", "fed", "potential", "preisach", "self_consistent_solver")
+HEAVY_MODULES = ("matplotlib", "scipy")
+
+C_A_MEAN = 1.27
+C_A_STD = 0.02
+
+STACKS = {
+    "Ti-AlScN-Al2O3-Pd": (Materials.titanium_electrode, Materials.alscn, Materials.al2o3, Materials.palladium_electrode),
+    "Ti-AlScN-HfO2-Pd": (Materials.titanium_electrode, Materials.alscn, Materials.hfo2, Materials.palladium_electrode),
+    "Ti-AlScN-TiO2-Pd": (Materials.titanium_electrode, Materials.alscn, Materials.tio2, Materials.palladium_electrode),
+}
+
+
+def measure(function, repeat):
+    """
+    :return: best wall time over repeat calls and peak traced memory of one call
+    """
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+def make_diode(num_domains, stack="Ti-AlScN-Al2O3-Pd"):
+    top, ferroelectric, insulator, bottom = STACKS[stack]
+    fe = Ferroelectric(num_domains, C_A_MEAN, C_A_STD)
+    fed = FerroelectricDiode(10, 30, 2, top, bottom, insulator, ferroelectric, fe)
+    return fe, fed, Potential(fed, 0)
+
+
+def domain_benchmarks(domain_counts, num_fields, repeat):
+    results = {}
+    fields = np.random.default_rng(0).normal(scale=1.5e-3, size=num_fields)
+    for n in domain_counts:
+        seconds, peak = measure(lambda: Ferroelectric(n, C_A_MEAN, C_A_STD), repeat)
+        results[f"construct[{n}]"] = {"seconds": seconds, "throughput": n / seconds, "unit": "domains/s",
+                                      "peak_bytes": peak}
+
+        fe = Ferroelectric(n, C_A_MEAN, C_A_STD)
+
+        def update():
+            for e_field in fields:
+                fe.update(e_field)
+
+        seconds, peak = measure(update, repeat)
+        results[f"update[{n}]"] = {"seconds": seconds, "throughput": n * num_fields / seconds,
+                                   "unit": "domain-updates/s", "peak_bytes": peak}
+
+        def avg_polarization():
+            for _ in range(num_fields):
+                fe.avg_polarization()
+
+        seconds, peak = measure(avg_polarization, repeat)
+        results[f"avg_polarization[{n}]"] = {"seconds": seconds, "throughput": n * num_fields / seconds,
+                                             "unit": "domains/s", "peak_bytes": peak}
+    return results
+
+
+def potential_benchmarks(grid_sizes, num_voltages, repeat):
+    results = {}
+    _, fed, potential = make_diode(1000)
+    voltages = np.linspace(-0.3, 0.3, num_voltages)
+
+    def set_vdiff():
+        for v in voltages:
+            potential.set_vdiff(v)
+
+    seconds, peak = measure(set_vdiff, repeat)
+    results["set_vdiff"] = {"seconds": seconds, "throughput": num_voltages / seconds, "unit": "calls/s",
+                            "peak_bytes": peak}
+
+    for n in grid_sizes:
+        x = np.linspace(potential.layer_boundaries[0] - 20, potential.layer_boundaries[-1] + 20, n)
+        seconds, peak = measure(lambda: potential.total_potential_profile(x), repeat)
+        results[f"total_potential_profile[{n}]"] = {"seconds": seconds, "throughput": n / seconds,
+                                                    "unit": "points/s", "peak_bytes": peak}
+    return results
+
+
+def solver_benchmarks(num_domains, num_voltages, repeat):
+    results = {}
+    v_sweep = np.concatenate([np.linspace(0, 8, num_voltages // 4),
+                              np.linspace(8, -8, num_voltages // 2),
+                              np.linspace(-8, 0, num_voltages - num_voltages // 4 - num_voltages // 2)])
+    for stack in STACKS:
+        def solve_sweep():
+            fe, _, potential = make_diode(num_domains, stack)
+            with warnings.catch_warnings():  # non-convergence is expected for some points of the sweep
+                warnings.filterwarnings("ignore", "Simulation for .* did not converge", RuntimeWarning)
+                SelfConsistentSolver(fe, potential).solve_sweep(v_sweep, progress=False)
+
+        seconds, peak = measure(solve_sweep, repeat)
+        results[f"solve_sweep[{stack},{num_domains}]"] = {"seconds": seconds, "throughput": len(v_sweep) / seconds,
+                                                          "unit": "points/s", "peak_bytes": peak}
+    return results
+
+
+def quasi_static_reference(fe, potential, voltages):
+    """
+    Exact quasi-static switching, one coercive field at a time: while the FE field crosses the lowest threshold
+    of the model, the domains at that threshold switch and the field is recomputed.
+    :return: polarization (atomic units) at each voltage
+    """
+    polarizations = []
+    for v in voltages:
+        v_diff = AtomicUnits.convert_volts(v)
+        potential.set_vdiff(v_diff)
+        while True:
+            up, down = fe.next_thresholds()
+            e_fe = potential.total_e_field_fe
+            if e_fe >= up:
+                fe.update(up)
+            elif e_fe <= down:
+                fe.update(down)
+            else:
+                break
+            potential.set_vdiff(v_diff)
+        polarizations.append(fe.avg_polarization())
+    return np.array(polarizations)
+
+
+def bracketing_check(num_domains, num_voltages):
+    """
+    Regression check of BracketingStrategy: with a zero threshold it must reproduce quasi_static_reference.
+    :return: largest polarization difference (uC/cm^2) over the sweeps of all stacks
+    """
+    v_sweep = np.concatenate([np.linspace(0, 8, num_voltages // 4),
+                              np.linspace(8, -8, num_voltages // 2),
+                              np.linspace(-8, 3, num_voltages - num_voltages // 4 - num_voltages // 2)])
+    difference = 0.0
+    for stack in STACKS:
+        fe, _, potential = make_diode(num_domains, stack)
+        solver = SelfConsistentSolver(fe, potential, threshold=0, strategy=BracketingStrategy())
+        solved = np.array(solver.solve_sweep(v_sweep, progress=False))
+        fe, _, potential = make_diode(num_domains, stack)
+        reference = quasi_static_reference(fe, potential, v_sweep)
+        difference = max(difference, np.abs(AtomicUnits.convert_back_polarization(solved - reference)).max())
+    return difference
+
+
+def import_check(repeat):
+    """
+    Imports the physics core in fresh interpreters.
+    :return: best import time in seconds and the heavy modules the import loaded
+    """
+    code = "import json, sys, time\n" \
+           "start = time.perf_counter()\n" \
+           f"import {', '.join(CORE_MODULES)}\n" \
+           "seconds = time.perf_counter() - start\n" \
+           f"heavy = sorted({{name.split('.')[0] for name in sys.modules}} & {set(HEAVY_MODULES)!r})\n" \
+           "print(json.dumps([seconds, heavy]))"
+    best, heavy = float("inf"), []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        seconds, heavy = json.loads(output)
+        best = min(best, seconds)
+    return best, heavy
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: names of the benchmarks whose throughput dropped more than tolerance below the baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["throughput"] < (1 - tolerance) * baseline[name]["throughput"]:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="optional path for the JSON results")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative throughput drop")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--import-budget", type=float, default=0.5, help="allowed core import time in seconds")
+    parser.add_argument("--imports-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    import_seconds, heavy = import_check(args.repeat)
+    import_failed = bool(heavy) or import_seconds > args.import_budget
+    print(f"{'import ' + ', '.join(CORE_MODULES):45s} {import_seconds:10.4f} s (budget {args.import_budget} s)"
+          + (f"  loads {', '.join(heavy)}" if heavy else "") + ("  OVER BUDGET" if import_failed else ""))
+    if args.imports_only:
+        return 1 if import_failed else 0
+
+    # one domain of the check ensemble is about 1e-3 uC/cm^2, anything above rounding is a wrong switching decision
+    bracketing_difference = bracketing_check(num_domains=20000, num_voltages=100)
+    bracketing_failed = bracketing_difference > 1e-9
+    print(f"{'bracketing vs quasi-static reference':45s} {bracketing_difference:10.3g} uC/cm^2"
+          + ("  MISMATCH" if bracketing_failed else ""))
+
+    if args.quick:
+        domain_counts, grid_sizes, solver_domains = [10 ** 3, 10 ** 4, 10 ** 5], [10 ** 3, 10 ** 4, 10 ** 5], 10 ** 4
+    else:
+        domain_counts, grid_sizes, solver_domains = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6], \
+            [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6], 10 ** 5
+
+    results = {}
+    results.update(domain_benchmarks(domain_counts, num_fields=1000, repeat=args.repeat))
+    results.update(potential_benchmarks(grid_sizes, num_voltages=1000, repeat=args.repeat))
+    results.update(solver_benchmarks(solver_domains, num_voltages=200, repeat=args.repeat))
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    regressions = compare(results, baseline, args.tolerance)
+
+    for name, result in results.items():
+        line = f"{name:45s} {result['seconds']:10.4f} s {result['throughput']:12.4g} {result['unit']:18s} " \
+               f"{result['peak_bytes'] / 2 ** 20:9.2f} MiB"
+        if name in baseline:
+            line += f" {result['throughput'] / baseline[name]['throughput']:6.2f}x baseline"
+        if name in regressions:
+            line += "  REGRESSION"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+    return 1 if regressions or import_failed or bracketing_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
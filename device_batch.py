@@ -0,0 +1,197 @@
+import numpy as np
+
+from atomicunits import AtomicUnits
+from fed import FerroelectricDiode, diode_layers, thomas_fermi_screening_length
+from layer_stack import LayerTable
+from material_types import MetalElectrode, Insulator, Ferroelectric
+from materials import Materials
+
+
+class MaterialTable:
+    def __init__(self, names, materials, fields):
+        """
+        Parallel arrays of the given fields of a list of materials of one type.
+        :param names: lookup name of each material
+        :param fields: attribute names copied into float arrays, None becomes nan
+        """
+        self.names = list(names)
+        self.materials = list(materials)
+        for field in fields:
+            setattr(self, field, np.array([np.nan if getattr(material, field) is None else getattr(material, field)
+                                           for material in self.materials], dtype=float))
+
+    def __len__(self):
+        return len(self.materials)
+
+    def index(self, materials):
+        """
+        :param materials: name, index, material object or an array-like of these
+        :return: integer index array into the table
+        """
+        def lookup(material):
+            if isinstance(material, (int, np.integer)):
+                return int(material)
+            if isinstance(material, str):
+                return self.names.index(material)
+            return next(i for i, m in enumerate(self.materials) if m is material)
+
+        if isinstance(materials, (str, int, np.integer)) or not np.iterable(materials):
+            return np.array(lookup(materials))
+        return np.array([lookup(material) for material in materials], dtype=int)
+
+
+class MaterialLibrary:
+    def __init__(self, electrodes, insulators, ferroelectrics):
+        """
+        Struct-of-arrays material library, materials are selected by index or name into each table.
+        :param electrodes: dict of name to MetalElectrode
+        :param insulators: dict of name to Insulator
+        :param ferroelectrics: dict of name to material_types.Ferroelectric
+        """
+        self.electrodes = MaterialTable(electrodes, electrodes.values(), ("n0", "e_f", "m_eff", "k", "w_f",
+                                                                          "screening_len"))
+        self.insulators = MaterialTable(insulators, insulators.values(), ("k", "chi", "m_eff", "breakdown_field"))
+        self.ferroelectrics = MaterialTable(ferroelectrics, ferroelectrics.values(), ("k", "p_r", "chi", "m_eff",
+                                                                                      "trap_depth"))
+
+        # Thomas-Fermi length where the electrode gives no screening length, as in FerroelectricDiode
+        electrodes = self.electrodes
+        electrodes.screening_len = np.where(np.isnan(electrodes.screening_len),
+                                            thomas_fermi_screening_length(electrodes.k, electrodes.e_f, electrodes.n0),
+                                            electrodes.screening_len)
+
+    @classmethod
+    def from_materials(cls, materials=Materials):
+        """
+        :return: library of the materials defined as attributes of materials, named by attribute
+        """
+        attributes = {name: value for name, value in vars(materials).items() if not name.startswith("_")}
+
+        def of_type(material_type):
+            return {name: value for name, value in attributes.items() if isinstance(value, material_type)}
+
+        return cls(of_type(MetalElectrode), of_type(Insulator), of_type(Ferroelectric))
+
+
+class DeviceBatch:
+    def __init__(self,
+                 insulator_thickness,
+                 fe_thickness,
+                 dead_layer_thickness,
+                 top_electrode,
+                 bottom_electrode,
+                 insulator,
+                 ferroelectric,
+                 library=None):
+        """
+        Batch of N ferroelectric diodes stored as parallel arrays, evaluating the electrostatics of
+        Potential.set_vdiff for all of them at once. Arguments are broadcast against each other to N devices. The
+        layers are fed.diode_layers of the batch attributes, in a LayerTable with the devices along the leading axes.
+        :param top_electrode: material names or indices into library.electrodes
+        :param bottom_electrode: material names or indices into library.electrodes
+        :param insulator: material names or indices into library.insulators
+        :param ferroelectric: material names or indices into library.ferroelectrics
+        :param library: MaterialLibrary, MaterialLibrary.from_materials() by default
+        """
+        self.library = MaterialLibrary.from_materials() if library is None else library
+        electrodes, insulators, ferroelectrics = \
+            self.library.electrodes, self.library.insulators, self.library.ferroelectrics
+        (self.insulator_thickness, self.fe_thickness, self.dl_thickness, self.top_index, self.bottom_index,
+         self.insulator_index, self.fe_index) = (np.array(a) for a in np.broadcast_arrays(
+            np.asarray(insulator_thickness, dtype=float), np.asarray(fe_thickness, dtype=float),
+            np.asarray(dead_layer_thickness, dtype=float), electrodes.index(top_electrode),
+            electrodes.index(bottom_electrode), insulators.index(insulator), ferroelectrics.index(ferroelectric)))
+        self.barrier_thickness = self.insulator_thickness + self.fe_thickness + self.dl_thickness
+
+        top, bottom = self.top_index, self.bottom_index
+        self.insulator_k = insulators.k[self.insulator_index]
+        self.fe_k = ferroelectrics.k[self.fe_index]
+        self.dl_k = self.fe_k / 2
+        self.top_k = electrodes.k[top]
+        self.bottom_k = electrodes.k[bottom]
+        self.insulator_chi = insulators.chi[self.insulator_index]
+        self.fe_chi = ferroelectrics.chi[self.fe_index]
+        self.top_work_fxn = electrodes.w_f[top]
+        self.bottom_work_fxn = electrodes.w_f[bottom]
+        self.top_fermi_e = electrodes.e_f[top]
+        self.bottom_fermi_e = electrodes.e_f[bottom]
+        self.top_screening_len = electrodes.screening_len[top]
+        self.bottom_screening_len = electrodes.screening_len[bottom]
+        self.insulator_m_eff = insulators.m_eff[self.insulator_index]
+        self.fe_m_eff = ferroelectrics.m_eff[self.fe_index]
+
+        table = self.layer_table = LayerTable(diode_layers(self), self.top_screening_len, self.top_k,
+                                              self.bottom_screening_len, self.bottom_k)
+        self.il_layer = table.index("insulator")
+        self.fe_layer = table.index("ferroelectric")
+        self.dl_layer = table.index("dead_layer")
+        # (N, layers) series capacitor terms
+        self.thicknesses = table.thicknesses
+        self.k = table.k
+        self.elastances = table.elastances
+        self.total_elastance = table.total_elastance
+
+        # built-in potential due to wf difference, does not change w/ applied V
+        self.dv_bi = table.built_in_drops(self.bottom_work_fxn - self.top_work_fxn)
+
+        self.v_diff = np.zeros(self.shape)
+        self.sigma_s = np.zeros(self.shape)
+        self.v_top_interface = np.zeros(self.shape)
+        self.dv_electrostatic = np.zeros(self.thicknesses.shape)
+        self.e_fields = np.zeros(self.thicknesses.shape)
+
+    @property
+    def shape(self):
+        return self.insulator_thickness.shape
+
+    def __len__(self):
+        return self.insulator_thickness.size
+
+    il_dv_bi = property(lambda self: self.dv_bi[..., self.il_layer])
+    fe_dv_bi = property(lambda self: self.dv_bi[..., self.fe_layer])
+    dl_dv_bi = property(lambda self: self.dv_bi[..., self.dl_layer])
+    il_dv_electrostatic = property(lambda self: self.dv_electrostatic[..., self.il_layer])
+    fe_dv_electrostatic = property(lambda self: self.dv_electrostatic[..., self.fe_layer])
+    dl_dv_electrostatic = property(lambda self: self.dv_electrostatic[..., self.dl_layer])
+    total_e_field_il = property(lambda self: self.e_fields[..., self.il_layer])
+    total_e_field_fe = property(lambda self: self.e_fields[..., self.fe_layer])
+    total_e_field_dl = property(lambda self: self.e_fields[..., self.dl_layer])
+
+    def set_vdiff(self, v_diff, fe_polarization, dl_polarization=0):
+        """
+        Potential.set_vdiff for every device of the batch.
+        :param v_diff: applied voltage, scalar or broadcastable to the batch shape
+        :param fe_polarization: FE polarization, scalar or broadcastable to the batch shape
+        :param dl_polarization: dead layer polarization, scalar or broadcastable to the batch shape
+        """
+        table = self.layer_table
+        self.v_diff = np.broadcast_to(np.asarray(v_diff, dtype=float), self.shape)
+        polarizations = table.layer_polarizations(fe_polarization, dl_polarization)
+        self.sigma_s = table.surface_charge(self.v_diff, polarizations)
+        self.dv_electrostatic = table.electrostatic_drops(self.sigma_s, polarizations)
+        self.v_top_interface = (self.sigma_s * self.top_screening_len) / (AtomicUnits.epsilon_0 * self.top_k)
+        self.e_fields = table.fields(self.dv_electrostatic + self.dv_bi)
+
+    def fe_field(self, v_diff, fe_polarization, dl_polarization=0):
+        """
+        Closed form of total_e_field_fe for the batch. Does not change the state of the batch.
+        """
+        table = self.layer_table
+        polarizations = table.layer_polarizations(fe_polarization, dl_polarization)
+        drops = table.electrostatic_drops(table.surface_charge(v_diff, polarizations), polarizations)
+        return table.fields(drops + self.dv_bi)[..., self.fe_layer]
+
+    def diode(self, index, fe_model):
+        """
+        :return: FerroelectricDiode for one device of the batch
+        """
+        index = np.unravel_index(index, self.shape) if np.ndim(index) == 0 and self.shape else index
+        library = self.library
+        return FerroelectricDiode(float(self.insulator_thickness[index]),
+                                  float(self.fe_thickness[index]),
+                                  float(self.dl_thickness[index]),
+                                  library.electrodes.materials[self.top_index[index]],
+                                  library.electrodes.materials[self.bottom_index[index]],
+                                  library.insulators.materials[self.insulator_index[index]],
+                                  library.ferroelectrics.materials[self.fe_index[index]],
+                                  fe_model)
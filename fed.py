@@ -1,6 +1,44 @@
-import math
-from atomicunits import AtomicUnits
-import scipy.constants as constants
+from atomicunits import AtomicUnits, EPSILON_0, ELEMENTARY_CHARGE
+from layer_stack import Layer, LayerStack
+import numpy as np
+
+
+def thomas_fermi_screening_length(k, e_f, n0):
+    """
+    Thomas-Fermi screening length of a metal electrode, vectorized over arrays of electrodes.
+    :param k: static dielectric constant
+    :param e_f: fermi energy (atomic units)
+    :param n0: electron density (atomic units)
+    :return: screening length (atomic units)
+    """
+    return AtomicUnits.m_to_bohr(np.sqrt(k * 2 * EPSILON_0 * AtomicUnits.hartree_to_joule(e_f) / (
+            3 * ELEMENTARY_CHARGE ** 2 * AtomicUnits.convert_back_density(n0))))
+
+
+def diode_layers(diode):
+    """
+    Layers of a ferroelectric diode, from the insulator, FE and dead layer attributes of diode. The attributes may be
+    arrays, as in device_batch.DeviceBatch.
+    :return: insulator, FE and dead layer
+    """
+    return [Layer(name="Insulator",
+                  kind="insulator",
+                  thickness=diode.insulator_thickness,
+                  k=diode.insulator_k,
+                  m_eff=diode.insulator_m_eff,
+                  barrier=diode.top_fermi_e + diode.top_work_fxn - diode.insulator_chi),
+            Layer(name="Ferroelectric",
+                  kind="ferroelectric",
+                  thickness=diode.fe_thickness,
+                  k=diode.fe_k,
+                  m_eff=diode.fe_m_eff,
+                  barrier=diode.bottom_fermi_e + diode.bottom_work_fxn - diode.fe_chi),
+            Layer(name="Dead Layer",
+                  kind="dead_layer",
+                  thickness=diode.dl_thickness,
+                  k=diode.dl_k,
+                  m_eff=diode.fe_m_eff,
+                  barrier=diode.bottom_fermi_e + diode.bottom_work_fxn - diode.fe_chi)]
 
 
 class FerroelectricDiode:
@@ -29,14 +67,14 @@ class FerroelectricDiode:
         self.fe_model = fe_model
 
         if top_electrode.screening_len is None:
-            self.top_screening_len = AtomicUnits.m_to_bohr(math.sqrt(
-                top_electrode.k * 2 * constants.epsilon_0 * AtomicUnits.hartree_to_joule(top_electrode.e_f) / (3 * constants.e ** 2 * AtomicUnits.convert_back_density(top_electrode.n0))))
+            self.top_screening_len = float(thomas_fermi_screening_length(top_electrode.k, top_electrode.e_f,
+                                                                         top_electrode.n0))
         else:
             self.top_screening_len = top_electrode.screening_len
 
         if bottom_electrode.screening_len is None:
-            self.bottom_screening_len = AtomicUnits.m_to_bohr(math.sqrt(
-                bottom_electrode.k * 2 * constants.epsilon_0 * AtomicUnits.hartree_to_joule(bottom_electrode.e_f) / (3 * constants.e ** 2 * AtomicUnits.convert_back_density(bottom_electrode.n0))))
+            self.bottom_screening_len = float(thomas_fermi_screening_length(bottom_electrode.k, bottom_electrode.e_f,
+                                                                            bottom_electrode.n0))
         else:
             self.bottom_screening_len = bottom_electrode.screening_len
 
@@ -49,27 +87,41 @@ class FerroelectricDiode:
         self.name = top_electrode.name + "-" + ferroelectric.name + "-" + insulator.name + "-" + bottom_electrode.name
         self.fe_polarization = self.fe_model.avg_polarization()
         self.dl_polarization = 0
+        self.layer_stack = self.build_layer_stack()
 
-    def m_eff(self, x):
-        if x <= 5 * self.top_screening_len:
-            return self.top_m_eff  # Top Metal Electrode
-
-        elif x <= 5 * self.top_screening_len + self.dl_thickness:
-            return self.fe_m_eff  # Dead Layer
+    def build_layer_stack(self):
+        return LayerStack(
+            layers=diode_layers(self),
+            top_screening_len=self.top_screening_len,
+            top_k=self.top_k,
+            top_m_eff=self.top_m_eff,
+            bottom_screening_len=self.bottom_screening_len,
+            bottom_k=self.bottom_k,
+            bottom_m_eff=self.bottom_m_eff,
+            bottom_level=self.top_fermi_e - self.bottom_fermi_e)
 
-        elif x <= 5 * self.top_screening_len + self.dl_thickness + self.fe_thickness:
-            return self.fe_m_eff  # FE layer
-
-        elif x <= 5 * self.top_screening_len + self.barrier_thickness:
-            return self.insulator_m_eff  # insulator Layer
-
-        else:
-            return self.bottom_m_eff  # Bottom Metal Electrode
+    def m_eff(self, x):
+        return self.layer_stack.region_m_eff_at(x)
 
     def set_fe_dl_thickness(self, fe_thickness, dl_thickness):
         self.fe_thickness = fe_thickness
         self.dl_thickness = dl_thickness
+        self.barrier_thickness = self.insulator_thickness + fe_thickness + dl_thickness
+        self.layer_stack = self.build_layer_stack()
+
+    def fingerprint(self):
+        """
+        :return: hashable summary of the geometry and material parameters that determine the potential profile
+        """
+        return (self.layer_stack.fingerprint, self.top_work_fxn, self.bottom_work_fxn, self.top_fermi_e,
+                self.bottom_fermi_e, self.dl_polarization)
 
     def get_polarization(self):
         self.fe_polarization = self.fe_model.avg_polarization()
         return self.fe_polarization
+
+    def layer_polarizations(self):
+        """
+        :return: polarization of each layer in layer_stack
+        """
+        return self.layer_stack.table.layer_polarizations(self.get_polarization(), self.dl_polarization)
@@ -0,0 +1,89 @@
+import numpy as np
+
+from units import from_atomic
+
+
+class Snapshot:
+    def __init__(self, voltage, polarization, model_state, v_diff):
+        """
+        State of a solver at one point of a field history.
+        :param model_state: model.get_state(), run lists for Ferroelectric so a snapshot costs O(runs)
+        :param v_diff: applied voltage of the potential, atomic units
+        """
+        self.voltage = voltage
+        self.polarization = polarization
+        self.model_state = model_state
+        self.v_diff = v_diff
+
+
+class FORCGenerator:
+    def __init__(self, solver, v_max, v_min=None, num_points=101):
+        """
+        First-order reversal curves of a SelfConsistentSolver. The major descending branch from +v_max is solved
+        once, the solver state is snapshotted at every reversal voltage, and each reversal curve branches from its
+        snapshot, so no shared segment of the history is solved twice. Snapshots hold get_state() copies, the
+        model restores them with set_state without copying the domain arrays.
+        :param solver: SelfConsistentSolver, any model with get_state/set_state
+        :param v_max: saturating voltage in V
+        :param v_min: lowest reversal voltage, -v_max by default
+        :param num_points: number of points of the voltage grid shared by reversal and measurement voltages
+        """
+        self.solver = solver
+        self.voltages = np.linspace(-v_max if v_min is None else v_min, v_max, num_points)
+        self.snapshots = None
+
+    def snapshot(self, voltage, polarization):
+        solver = self.solver
+        return Snapshot(voltage, polarization, solver.ferroelectric.get_state(), solver.potential.v_diff)
+
+    def restore(self, snapshot):
+        self.solver.ferroelectric.set_state(snapshot.model_state)
+        self.solver.potential.set_vdiff(snapshot.v_diff)
+
+    def branch(self, snapshot, voltages):
+        """
+        Solves voltages starting from the state of snapshot, leaving the snapshot unchanged.
+        :return: polarizations (atomic units)
+        """
+        self.restore(snapshot)
+        return np.array([self.solver.solve(v)[0] for v in voltages], dtype=float)
+
+    def descend(self):
+        """
+        Saturates at the top of the grid and descends through the reversal voltages.
+        :return: one snapshot per grid voltage, in ascending voltage order
+        """
+        solver = self.solver
+        snapshots = []
+        for v in self.voltages[::-1]:
+            polarization, _ = solver.solve(v)
+            snapshots.append(self.snapshot(v, polarization))
+        self.snapshots = snapshots[::-1]
+        return self.snapshots
+
+    def reversal_curves(self):
+        """
+        :return: generator of (reversal voltage, voltages, polarizations in atomic units) for each reversal curve,
+        measured from the reversal voltage up to the top of the grid
+        """
+        snapshots = self.descend() if self.snapshots is None else self.snapshots
+        for i, snapshot in enumerate(snapshots):
+            voltages = self.voltages[i + 1:]
+            polarizations = np.concatenate(([snapshot.polarization], self.branch(snapshot, voltages)))
+            yield snapshot.voltage, self.voltages[i:], polarizations
+
+    def distribution(self):
+        """
+        :return: voltage grid (V), polarization P[reversal, voltage] (uC/cm^2) and FORC distribution
+        -1/2 d^2P / dV_r dV ((uC/cm^2)/V^2), both of shape (num_points, num_points). Below the reversal voltage P is
+        extended with its value at the reversal point, where the distribution is zero.
+        """
+        n = len(self.voltages)
+        polarization = np.empty((n, n))
+        for i, (_, _, polarizations) in enumerate(self.reversal_curves()):
+            polarization[i, i:] = polarizations
+            polarization[i, :i] = polarizations[0]
+        polarization = from_atomic(polarization, "uC/cm^2", out=polarization)
+        d_dv = np.gradient(polarization, self.voltages, axis=1)
+        density = -0.5 * np.gradient(d_dv, self.voltages, axis=0)
+        return self.voltages, polarization, density
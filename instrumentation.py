@@ -0,0 +1,98 @@
+import time
+
+import numpy as np
+
+TIMED_CALLS = ("set_vdiff", "update", "avg_polarization", "fe_field", "preview")
+
+RECORD_DTYPE = np.dtype([("voltage", "f8"),
+                         ("iterations", "i8"),
+                         ("converged", "?"),
+                         ("residual", "f8"),
+                         ("updates", "i8"),
+                         ("switched", "i8"),
+                         ("wall_time", "f8")] +
+                        [("t_" + name, "f8") for name in TIMED_CALLS])
+
+
+class SolverInstrument:
+    def __init__(self, keep_residual_history=True, callback=None):
+        """
+        Event sink for SelfConsistentSolver. Collects one record per solved voltage with the iteration count,
+        convergence flag, final residual, number of domain updates and switched domains, and the wall time spent in
+        set_vdiff, update, avg_polarization, fe_field and preview. A solver without an instrument calls the model
+        and potential directly, so instrumentation costs nothing when disabled.
+        :param keep_residual_history: keep the polarization change (uc/cm^2) of every domain update
+        :param callback: optional function called with each finished record (a dict)
+        """
+        self.keep_residual_history = keep_residual_history
+        self.callback = callback
+        self.records = []
+        self.residual_history = []
+        self._current = None
+        self._history = None
+        self._start = 0.0
+
+    def begin(self, voltage):
+        self._current = dict.fromkeys(RECORD_DTYPE.names, 0)
+        self._current["voltage"] = voltage
+        self._history = [] if self.keep_residual_history else None
+        self._start = time.perf_counter()
+
+    def end(self, iterations, converged, residual):
+        record = self._current
+        record["wall_time"] = time.perf_counter() - self._start
+        record["iterations"] = iterations
+        record["converged"] = converged
+        record["residual"] = residual
+        self.records.append(tuple(record[name] for name in RECORD_DTYPE.names))
+        if self._history is not None:
+            self.residual_history.append(np.array(self._history))
+        if self.callback is not None:
+            self.callback(record)
+        self._current = None
+
+    def timed(self, name, function):
+        """
+        :return: function wrapped to add its wall time to the t_<name> field of the current record
+        """
+        field = "t_" + name
+
+        def wrapper(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            if self._current is not None:
+                self._current[field] += time.perf_counter() - start
+            return result
+
+        return wrapper
+
+    def timed_update(self, model, to_residual):
+        """
+        :param to_residual: converts a polarization change to the unit of the residual history
+        :return: model.update wrapped to also record the residual history and switched-domain count
+        """
+        timed = self.timed("update", model.update)
+
+        def wrapper(e_field):
+            p_change = timed(e_field)
+            if self._current is not None:
+                self._current["updates"] += 1
+                self._current["switched"] += getattr(model, "last_switched", 0)
+                if self._history is not None:
+                    self._history.append(to_residual(p_change))
+            return p_change
+
+        return wrapper
+
+    def to_records(self):
+        """
+        :return: numpy record array with one row per solved voltage
+        """
+        return np.rec.array(np.array(self.records, dtype=RECORD_DTYPE))
+
+    def slowest(self, count=10, by="wall_time"):
+        """
+        :return: records of the count slowest voltage points
+        """
+        records = self.to_records()
+        return records[np.argsort(records[by])[::-1][:count]]
@@ -0,0 +1,159 @@
+from atomicunits import AtomicUnits
+import numpy as np
+
+
+class Layer:
+    def __init__(self, name, kind, thickness, k, m_eff, barrier):
+        """
+        :param name: layer label
+        :param kind: "insulator", "ferroelectric" or "dead_layer", selects the polarization carried by the layer
+        :param thickness: layer thickness
+        :param k: dielectric constant
+        :param m_eff: effective mass of electron
+        :param barrier: conduction band edge of the layer, measured from the top electrode band bottom
+        """
+        self.name = name
+        self.kind = kind
+        self.thickness = thickness
+        self.k = k
+        self.m_eff = m_eff
+        self.barrier = barrier
+
+
+class LayerTable:
+    def __init__(self, layers, top_screening_len, top_k, bottom_screening_len, bottom_k):
+        """
+        Series capacitor table of an ordered stack of layers between two screening electrodes. Layer and electrode
+        parameters may also be arrays of a common shape, for a batch of stacks with the same sequence of layer kinds.
+        The per-layer tables then have that shape with the layers along the last axis.
+        :param layers: Layer objects ordered from the top electrode to the bottom electrode
+        """
+        self.kinds = np.array([layer.kind for layer in layers])
+        shape = np.broadcast_shapes(*(np.shape(value) for layer in layers for value in (layer.thickness, layer.k)),
+                                    np.shape(top_screening_len), np.shape(top_k), np.shape(bottom_screening_len),
+                                    np.shape(bottom_k))
+        self.thicknesses = np.stack([np.broadcast_to(np.asarray(layer.thickness, dtype=float), shape)
+                                     for layer in layers], axis=-1)
+        self.k = np.stack([np.broadcast_to(np.asarray(layer.k, dtype=float), shape) for layer in layers], axis=-1)
+
+        # series capacitor terms, thickness / k of each layer and of the two screening regions
+        self.elastances = self.thicknesses / self.k
+        self.screening_elastance = top_screening_len / top_k + bottom_screening_len / bottom_k
+        self.total_elastance = self.screening_elastance + self.elastances.sum(axis=-1)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def index(self, kind):
+        """
+        :return: index of the first layer of the given kind, or None
+        """
+        matches = np.flatnonzero(self.kinds == kind)
+        return int(matches[0]) if len(matches) else None
+
+    def built_in_drops(self, d_wf):
+        """
+        :return: drop of a work function difference d_wf across each layer of the series capacitor
+        """
+        return np.asarray(d_wf)[..., None] * self.elastances / self.elastances.sum(axis=-1, keepdims=True)
+
+    def layer_polarizations(self, fe_polarization, dl_polarization=0):
+        """
+        :return: polarization of each layer, ferroelectric layers carry fe_polarization and dead layers
+        dl_polarization
+        """
+        return np.asarray(fe_polarization, dtype=float)[..., None] * (self.kinds == "ferroelectric") + \
+            np.asarray(dl_polarization, dtype=float)[..., None] * (self.kinds == "dead_layer")
+
+    def surface_charge(self, v_diff, polarizations):
+        """
+        :return: screening charge on the electrodes at applied voltage v_diff
+        """
+        return (np.sum(polarizations * self.elastances, axis=-1) + AtomicUnits.epsilon_0 * np.asarray(v_diff)) / \
+            self.total_elastance
+
+    def electrostatic_drops(self, sigma_s, polarizations):
+        """
+        :return: electrostatic drop across each layer
+        """
+        return (np.asarray(sigma_s)[..., None] - polarizations) * self.elastances / AtomicUnits.epsilon_0
+
+    def fields(self, drops):
+        """
+        :return: field of the total drops across each layer, left at zero in layers of zero thickness
+        """
+        drops, thicknesses = np.broadcast_arrays(drops, self.thicknesses)
+        return np.divide(drops, thicknesses, out=np.zeros(drops.shape), where=thicknesses != 0)
+
+
+class LayerStack:
+    def __init__(self,
+                 layers,
+                 top_screening_len,
+                 top_k,
+                 top_m_eff,
+                 bottom_screening_len,
+                 bottom_k,
+                 bottom_m_eff,
+                 bottom_level):
+        """
+        Geometry table of an ordered stack of dielectric layers between two screening electrodes. Positions are
+        split into regions: 0 left of the device, 1 top screening region, 2..n+1 the layers, n+2 bottom screening
+        region, n+3 right of the device. The series capacitor terms come from a LayerTable of the layers. The table is
+        immutable, build a new one when the geometry changes.
+        :param layers: Layer objects ordered from the top electrode to the bottom electrode
+        :param bottom_level: band bottom of the bottom electrode, measured from the top electrode band bottom
+        """
+        self.layers = list(layers)
+        self.names = [layer.name for layer in self.layers]
+        self.table = LayerTable(self.layers, top_screening_len, top_k, bottom_screening_len, bottom_k)
+        self.kinds = self.table.kinds
+        self.thicknesses = self.table.thicknesses
+        self.k = self.table.k
+        self.m_eff = np.array([layer.m_eff for layer in self.layers], dtype=float)
+        self.barriers = np.array([layer.barrier for layer in self.layers], dtype=float)
+        self.top_screening_len = top_screening_len
+        self.top_k = top_k
+        self.bottom_screening_len = bottom_screening_len
+        self.bottom_k = bottom_k
+
+        top_end = 5 * top_screening_len
+        self.layer_starts = top_end + np.concatenate(([0], np.cumsum(self.thicknesses)[:-1]))
+        self.barrier_thickness = self.thicknesses.sum()
+        self.boundaries = np.concatenate(([0, top_end],
+                                          top_end + np.cumsum(self.thicknesses),
+                                          [top_end + self.barrier_thickness + 5 * bottom_screening_len]))
+
+        self.region_starts = np.concatenate(([0, 0], self.layer_starts, [0, 0]))
+        self.region_widths = np.concatenate(([0, 0], self.thicknesses, [0, 0]))
+        self.region_m_eff = np.concatenate(([top_m_eff, top_m_eff], self.m_eff, [bottom_m_eff, bottom_m_eff]))
+        self.region_barriers = np.concatenate(([0, 0], self.barriers, [bottom_level, bottom_level]))
+
+        self.elastances = self.table.elastances
+        self.screening_elastance = self.table.screening_elastance
+        self.total_elastance = self.table.total_elastance
+
+        self.fingerprint = (tuple(self.kinds.tolist()), tuple(self.thicknesses.tolist()), tuple(self.k.tolist()),
+                            tuple(self.m_eff.tolist()), tuple(self.region_barriers.tolist()),
+                            top_screening_len, top_k, top_m_eff, bottom_screening_len, bottom_k, bottom_m_eff)
+
+    def __len__(self):
+        return len(self.layers)
+
+    def regions(self, x):
+        return np.searchsorted(self.boundaries, x, side="left")
+
+    def region_m_eff_at(self, x):
+        return self.region_m_eff[self.regions(x)]
+
+    def index(self, kind):
+        """
+        :return: index of the first layer of the given kind, or None
+        """
+        return self.table.index(kind)
+
+    def built_in_drops(self, d_wf):
+        """
+        :return: drop of a work function difference d_wf across each layer of the series capacitor
+        """
+        return self.table.built_in_drops(d_wf)
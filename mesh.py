@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def screening_offsets(screening_len, tolerance, width=None, max_step=None):
+    """
+    Graded distances from an interface into an exponential screening tail A exp(-d / screening_len). Linear
+    interpolation between points d and d + h errs by at most h^2 / 8 * |f''|, so the step
+    h(d) = screening_len * sqrt(8 * tolerance * exp(d / screening_len)) keeps the error below tolerance * A. Steps
+    grow geometrically away from the interface.
+    :param width: extent of the tail, 5 screening lengths by default
+    :param max_step: optional upper limit of the step
+    :return: increasing distances starting at 0 and ending at width
+    """
+    if not tolerance > 0:
+        raise ValueError(f"tolerance must be positive, got {tolerance!r}")
+    width = 5 * screening_len if width is None else width
+    offsets = [0.0]
+    while offsets[-1] < width:
+        step = screening_len * np.sqrt(8 * tolerance * np.exp(offsets[-1] / screening_len))
+        if max_step is not None:
+            step = min(step, max_step)
+        offsets.append(offsets[-1] + step)
+    offsets[-1] = width
+    return np.array(offsets)
+
+
+def _subdivide(start, end, max_step):
+    if max_step is None or end - start <= max_step:
+        return np.array([start, end])
+    return np.linspace(start, end, int(np.ceil((end - start) / max_step)) + 1)
+
+
+def adaptive_mesh(layer_stack, tolerance=1e-4, layer_step=None, margin=0.0, margin_step=None):
+    """
+    Non-uniform positions for the potential profiles of a diode. The profiles are exponential in the two screening
+    regions and linear inside the layers, so the screening tails get graded points (screening_offsets) while a
+    layer only needs its two ends. Every internal boundary is also sampled just right of itself, so the steps of
+    the barrier profile stay sharp. Linear interpolation of the electrostatic profile between the points errs by
+    at most tolerance times the screening amplitude.
+    :param layer_stack: LayerStack of the diode (Potential.layer_stack or FerroelectricDiode.layer_stack)
+    :param tolerance: relative interpolation error allowed in the screening tails
+    :param layer_step: optional maximum step inside the layers. The profiles themselves need none, integrals of
+    nonlinear functions of the profile (e.g. the WKB exponent in tunneling.TunnelingCurrent) do.
+    :param margin: extent of the flat electrode bulk added on both sides, e.g. 10 nm for graph_potential
+    :param margin_step: optional maximum step in the margins
+    :return: increasing positions
+    """
+    b = layer_stack.boundaries
+    top = b[1] - screening_offsets(layer_stack.top_screening_len, tolerance)[::-1]
+    bottom = b[-2] + screening_offsets(layer_stack.bottom_screening_len, tolerance)
+    pieces = [top, bottom]
+    for start, end in zip(b[1:-2], b[2:-1]):
+        pieces.append(_subdivide(start, end, layer_step))
+    if margin > 0:
+        pieces.append(_subdivide(b[0] - margin, b[0], margin_step))
+        pieces.append(_subdivide(b[-1], b[-1] + margin, margin_step))
+    pieces.append(np.nextafter(b, np.inf))
+    x = np.unique(np.concatenate(pieces))
+    return x[(x >= b[0] - margin) & (x <= b[-1] + margin)]
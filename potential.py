@@ -1,5 +1,5 @@
 from atomicunits import AtomicUnits
-from matplotlib import pyplot as plt
+from mesh import adaptive_mesh
 import numpy as np
 
 
@@ -25,177 +25,227 @@ class Potential:
         self.fe_v_barrier = fed.bottom_work_fxn - fed.fe_chi
         self.dl_v_barrier = fed.bottom_work_fxn - fed.fe_chi
 
-        # built-in potential due to wf difference, does not change w/ applied V
-        d_wf = fed.bottom_work_fxn - fed.top_work_fxn
-        self.il_dv_bi = d_wf * fed.insulator_thickness / (fed.insulator_thickness +
-                                                          fed.insulator_k / fed.fe_k * fed.fe_thickness +
-                                                          fed.insulator_k / fed.dl_k * fed.dl_thickness)
-        self.fe_dv_bi = d_wf * fed.fe_thickness / (fed.fe_thickness +
-                                                   fed.fe_k / fed.insulator_k * fed.insulator_thickness +
-                                                   fed.fe_k / fed.dl_k * fed.dl_thickness)
-        self.dl_dv_bi = d_wf * fed.dl_thickness / (fed.dl_thickness +
-                                                   fed.dl_k / fed.fe_k * fed.fe_thickness +
-                                                   fed.dl_k / fed.insulator_k * fed.insulator_thickness)
-
+        self.set_geometry()
         self.set_vdiff(v_diff)
 
+    def set_geometry(self):
+        """
+        Reads the diode's layer stack. Called again by set_vdiff whenever the diode rebuilds its stack.
+        """
+        stack = self.fed.layer_stack
+        self.layer_stack = stack
+        self.layer_boundaries = stack.boundaries
+        self.il_index = stack.index("insulator")
+        self.fe_index = stack.index("ferroelectric")
+        self.dl_index = stack.index("dead_layer")
+
+        # built-in potential due to wf difference, does not change w/ applied V
+        self.dv_bi = stack.built_in_drops(self.fed.bottom_work_fxn - self.fed.top_work_fxn)
+        self.il_dv_bi, self.fe_dv_bi, self.dl_dv_bi = self._named(self.dv_bi, 0)
+
+        # per-call constants of set_vdiff and fe_field, so that the solver loop only does scalar arithmetic
+        self._fe_elastance = float(np.dot(stack.table.layer_polarizations(1.0, 0.0), stack.elastances))
+        self._dl_elastance = float(np.dot(stack.table.layer_polarizations(0.0, 1.0), stack.elastances))
+        self._total_elastance = float(stack.total_elastance)
+        # (elastance / epsilon_0, built-in drop, thickness) of the insulator, FE and dead layer. Missing layers and
+        # layers of zero thickness get zero drops, which leaves their fields at zero.
+        self._named_terms = tuple((0.0, 0.0, 1.0) if i is None else
+                                  (float(stack.elastances[i] / AtomicUnits.epsilon_0), float(self.dv_bi[i]),
+                                   float(stack.thicknesses[i]) or 1.0)
+                                  for i in (self.il_index, self.fe_index, self.dl_index))
+
+        self._polarizations = (0.0, 0.0)
+        self.dv_electrostatic = np.zeros(len(stack))
+        self.e_fields = np.zeros(len(stack))
+
+    def _named(self, values, default):
+        """
+        :return: insulator, FE and dead layer entries of a per-layer array
+        """
+        return tuple(default if i is None else float(values[i]) for i in (self.il_index, self.fe_index, self.dl_index))
+
+    @property
+    def dv_electrostatic(self):
+        """
+        Electrostatic drop across each layer, computed from the last set_vdiff on first use.
+        """
+        if self._dv_electrostatic is None:
+            table = self.layer_stack.table
+            self._dv_electrostatic = table.electrostatic_drops(self.sigma_s,
+                                                               table.layer_polarizations(*self._polarizations))
+        return self._dv_electrostatic
+
+    @dv_electrostatic.setter
+    def dv_electrostatic(self, value):
+        self._dv_electrostatic = value
+
+    @property
+    def e_fields(self):
+        """
+        Total field in each layer, zero in layers of zero thickness.
+        """
+        if self._e_fields is None:
+            self._e_fields = self.layer_stack.table.fields(self.dv_electrostatic + self.dv_bi)
+        return self._e_fields
+
+    @e_fields.setter
+    def e_fields(self, value):
+        self._e_fields = value
+
     def set_vdiff(self, v_diff):
         fed = self.fed
+        if fed.layer_stack is not self.layer_stack:
+            self.set_geometry()
         self.v_diff = v_diff
-        self.sigma_s = (fed.dl_polarization * fed.dl_thickness / fed.dl_k +
-                        fed.get_polarization() * fed.fe_thickness / fed.fe_k + AtomicUnits.epsilon_0 * self.v_diff) / (
-                               fed.top_screening_len / fed.top_k + fed.bottom_screening_len / fed.bottom_k +
-                               fed.dl_thickness / fed.dl_k +
-                               fed.fe_thickness / fed.fe_k +
-                               fed.insulator_thickness / fed.insulator_k)
-
-        self.il_dv_electrostatic = self.sigma_s / (fed.insulator_k * AtomicUnits.epsilon_0) * fed.insulator_thickness
-        self.fe_dv_electrostatic = (self.sigma_s - fed.get_polarization()) / (
-                fed.fe_k * AtomicUnits.epsilon_0) * fed.fe_thickness
-        self.dl_dv_electrostatic = (self.sigma_s - fed.dl_polarization) / (
-                fed.dl_k * AtomicUnits.epsilon_0) * fed.dl_thickness
-        self.v_top_interface = (self.sigma_s * fed.top_screening_len) / (
-                    AtomicUnits.epsilon_0 * fed.top_k)
-
-        if fed.insulator_thickness != 0:
-            self.total_e_field_il = (self.il_dv_electrostatic + self.il_dv_bi) / fed.insulator_thickness
-        if fed.dl_thickness != 0:
-            self.total_e_field_dl = (self.dl_dv_electrostatic + self.dl_dv_bi) / fed.dl_thickness
-        self.total_e_field_fe = (self.fe_dv_electrostatic + self.fe_dv_bi) / fed.fe_thickness
 
-    def electrostatic_potential(self, x):
-        fed = self.fed
-        if x <= 0:
-            return 0  # region 1
+        fe_polarization = fed.get_polarization()
+        dl_polarization = fed.dl_polarization
+        self._polarizations = (fe_polarization, dl_polarization)
+        self._dv_electrostatic = self._e_fields = None
+        sigma_s = self.sigma_s = (fe_polarization * self._fe_elastance + dl_polarization * self._dl_elastance +
+                                  AtomicUnits.epsilon_0 * v_diff) / self._total_elastance
+        self.v_top_interface = (sigma_s * fed.top_screening_len) / (AtomicUnits.epsilon_0 * fed.top_k)
+
+        (il_scale, il_bi, il_thickness), (fe_scale, fe_bi, fe_thickness), (dl_scale, dl_bi, dl_thickness) = \
+            self._named_terms
+        self.il_dv_electrostatic = sigma_s * il_scale
+        self.fe_dv_electrostatic = (sigma_s - fe_polarization) * fe_scale
+        self.dl_dv_electrostatic = (sigma_s - dl_polarization) * dl_scale
+        self.total_e_field_il = (self.il_dv_electrostatic + il_bi) / il_thickness
+        self.total_e_field_fe = (self.fe_dv_electrostatic + fe_bi) / fe_thickness
+        self.total_e_field_dl = (self.dl_dv_electrostatic + dl_bi) / dl_thickness
+
+    def fe_field(self, v_diff, fe_polarization):
+        """
+        Closed form of total_e_field_fe for scalars or arrays of applied voltages and FE polarizations. The dead
+        layer keeps the diode's dl_polarization. Does not change the state of the potential.
+        """
+        if self.fed.layer_stack is not self.layer_stack:
+            self.set_geometry()
+        _, (fe_scale, fe_bi, fe_thickness), _ = self._named_terms
+        sigma_s = (fe_polarization * self._fe_elastance + self.fed.dl_polarization * self._dl_elastance +
+                   AtomicUnits.epsilon_0 * v_diff) / self._total_elastance
+        return ((sigma_s - fe_polarization) * fe_scale + fe_bi) / fe_thickness
 
-        elif x <= 5 * fed.top_screening_len:  # within screen len of top electrode
-            return self.sigma_s * fed.top_screening_len * np.exp(
-                    -abs(5 * fed.top_screening_len - x) / fed.top_screening_len) \
-                / (AtomicUnits.epsilon_0 * fed.top_k)
-
-        elif x <= 5 * fed.top_screening_len + fed.insulator_thickness:
-            pos = x - 5 * fed.top_screening_len
-            return self.v_top_interface + (pos / fed.insulator_thickness) * self.il_dv_electrostatic
-
-        elif x <= 5 * fed.top_screening_len + fed.insulator_thickness + fed.fe_thickness:
-            pos = x - (5 * fed.top_screening_len + fed.insulator_thickness)
-            return self.v_top_interface + self.il_dv_electrostatic + (pos / fed.fe_thickness) * self.fe_dv_electrostatic
-
-        elif x <= 5 * fed.top_screening_len + fed.barrier_thickness:
-            pos = x - (5 * fed.top_screening_len + fed.insulator_thickness + fed.fe_thickness)
-            return self.v_top_interface + self.il_dv_electrostatic + self.fe_dv_electrostatic + (
-                    pos / fed.dl_thickness) * self.dl_dv_electrostatic
-
-        elif x <= 5 * fed.top_screening_len + fed.barrier_thickness + 5 * fed.bottom_screening_len:  # within screen
-            # len of bottom electrode
-            return -(self.sigma_s * fed.bottom_screening_len * np.exp(-abs(x - (
-                    5 * fed.top_screening_len + fed.barrier_thickness)) / fed.bottom_screening_len) /
-                     (AtomicUnits.epsilon_0 * fed.bottom_k)) + self.v_diff
-
-        else:
-            return self.v_diff
+    def electrostatic_potential(self, x):
+        return float(self.electrostatic_potential_profile(x))
 
     def barrier_potential(self, x):
-        fed = self.fed
-        if x <= 5 * fed.top_screening_len:
-            return 0  # Top Metal Electrode
-
-        elif x <= 5 * fed.top_screening_len + fed.insulator_thickness:
-            return fed.top_fermi_e + self.il_v_barrier  # insulator layer
-
-        elif x <= 5 * fed.top_screening_len + fed.insulator_thickness + fed.fe_thickness:
-            return fed.bottom_fermi_e + self.fe_v_barrier  # FE layer
-
-        elif x <= 5 * fed.top_screening_len + fed.barrier_thickness:
-            return fed.bottom_fermi_e + self.dl_v_barrier  # dead layer
-
-        else:
-            return self.fed.top_fermi_e - self.fed.bottom_fermi_e # Bottom Metal Electrode
+        return float(self.barrier_potential_profile(x))
 
     def wf_potential(self, x):
-        fed = self.fed
-        if x <= 5 * fed.top_screening_len:
-            return 0  # Top Metal Electrode
-
-        elif x <= 5 * fed.top_screening_len + fed.insulator_thickness:
-            pos = x - 5 * fed.top_screening_len
-            return (pos / fed.insulator_thickness) * self.il_dv_bi
-
-        elif x <= 5 * fed.top_screening_len + fed.insulator_thickness + fed.fe_thickness:
-            pos = x - (5 * fed.top_screening_len + fed.insulator_thickness)
-            return self.il_dv_bi + (pos / fed.fe_thickness) * self.fe_dv_bi
-
-        elif x <= 5 * fed.top_screening_len + fed.barrier_thickness:
-            pos = x - (5 * fed.top_screening_len + fed.insulator_thickness + fed.fe_thickness)
-            return self.il_dv_bi + self.fe_dv_bi + (pos / fed.dl_thickness) * self.dl_dv_bi
-
-        else:
-            return 0
-  # Bottom Metal Electrode
+        return float(self.wf_potential_profile(x))
 
     def total_potential(self, x):
-        return self.electrostatic_potential(x) + self.barrier_potential(x) + self.wf_potential(x)
-
-    def graph_potential(self, potential_type, precision):
+        return float(self.total_potential_profile(x))
+
+    def layer_regions(self, x):
+        """
+        :return: region index of each position, 0 left of the device, 1 top screening region, 2..n+1 the layers of
+        the stack, n+2 bottom screening region, n+3 right of the device
+        """
+        return self.layer_stack.regions(x)
+
+    def _linear_profile(self, x, regions, offsets, drops):
+        """
+        Evaluates a profile that is linear inside each layer and constant elsewhere.
+        :param offsets: value at the start of each region
+        :param drops: change across each region, only used for the layers
+        """
+        stack = self.layer_stack
+        widths = stack.region_widths
+        slopes = np.divide(drops, widths, out=np.zeros(len(widths)), where=widths != 0)
+        return offsets[regions] + slopes[regions] * (x - stack.region_starts[regions])
+
+    def electrostatic_potential_profile(self, x):
+        """
+        Vectorized electrostatic_potential for an array of positions.
+        """
         fed = self.fed
-        x = np.arange(AtomicUnits.nm_to_bohr(-10),
-                      5 * fed.top_screening_len + fed.barrier_thickness + 5 * fed.bottom_screening_len + AtomicUnits.nm_to_bohr(
-                          10),
-                      precision)
-        y = np.zeros(len(x))
-        potential = lambda *args: print("Invalid Potential Type")
+        shape = np.shape(x)
+        x = np.asarray(x, dtype=float).reshape(-1)
+        regions = self.layer_regions(x)
+        b = self.layer_boundaries
+        layer_offsets = self.v_top_interface + np.cumsum(self.dv_electrostatic) - self.dv_electrostatic
+        offsets = np.concatenate(([0, 0], layer_offsets, [self.v_diff, self.v_diff]))
+        drops = np.concatenate(([0, 0], self.dv_electrostatic, [0, 0]))
+        profile = self._linear_profile(x, regions, offsets, drops)
+
+        top = regions == 1  # within screen len of top electrode
+        profile[top] = self.sigma_s * fed.top_screening_len * np.exp(
+            -np.abs(b[1] - x[top]) / fed.top_screening_len) / (AtomicUnits.epsilon_0 * fed.top_k)
+        bottom = regions == len(b) - 1  # within screen len of bottom electrode
+        profile[bottom] -= self.sigma_s * fed.bottom_screening_len * np.exp(
+            -np.abs(x[bottom] - b[-2]) / fed.bottom_screening_len) / (AtomicUnits.epsilon_0 * fed.bottom_k)
+        return profile.reshape(shape)
+
+    def barrier_potential_profile(self, x):
+        """
+        Vectorized barrier_potential for an array of positions.
+        """
+        return self.layer_stack.region_barriers[self.layer_regions(np.asarray(x, dtype=float))]
+
+    def wf_potential_profile(self, x):
+        """
+        Vectorized wf_potential for an array of positions.
+        """
+        x = np.asarray(x, dtype=float)
+        offsets = np.concatenate(([0, 0], np.cumsum(self.dv_bi) - self.dv_bi, [0, 0]))
+        drops = np.concatenate(([0, 0], self.dv_bi, [0, 0]))
+        return self._linear_profile(x, self.layer_regions(x), offsets, drops)
+
+    def total_potential_profile(self, x):
+        """
+        Vectorized total_potential for an array of positions.
+        """
+        return self.electrostatic_potential_profile(x) + self.barrier_potential_profile(x) + \
+            self.wf_potential_profile(x)
+
+    def profile_function(self, potential_type):
+        """
+        :param potential_type: "Electrostatic", "Barrier", "Built-in" or "Total"
+        :return: vectorized profile function of positions
+        """
         match potential_type:
             case "Electrostatic":
-                potential = self.electrostatic_potential
+                return self.electrostatic_potential_profile
             case "Barrier":
-                potential = self.barrier_potential
+                return self.barrier_potential_profile
             case "Built-in":
-                potential = self.wf_potential
+                return self.wf_potential_profile
             case "Total":
-                potential = self.total_potential
+                return self.total_potential_profile
             case _:
-                pass
+                return lambda positions: print("Invalid Potential Type") or np.zeros(len(positions))
 
-        for i in range(len(x)):
-            y[i] = AtomicUnits.hartree_to_ev(potential(x[i]))
+    def graph_potential(self, potential_type, precision=None, x=None):
+        """
+        :param precision: step of a uniform position grid
+        :param x: optional positions to plot at. Without precision and x, mesh.adaptive_mesh is used.
+        """
+        fed = self.fed
+        if x is None and precision is None:
+            x = adaptive_mesh(self.layer_stack, margin=AtomicUnits.nm_to_bohr(10))
+        elif x is None:
+            x = np.arange(AtomicUnits.nm_to_bohr(-10),
+                          5 * fed.top_screening_len + fed.barrier_thickness + 5 * fed.bottom_screening_len + AtomicUnits.nm_to_bohr(
+                              10),
+                          precision)
+
+        from matplotlib import pyplot as plt  # imported on first use, the physics core does not need matplotlib
+        from rendering import draw_layer_bands, fermi_level_spans
+
+        y = AtomicUnits.hartree_to_ev(self.profile_function(potential_type)(x))
         x = AtomicUnits.bohr_to_nm(x)
         fig, ax = plt.subplots(figsize=(15, 10), dpi=120)
         plt.xlabel("Position (nm)", fontsize=20)
         plt.ylabel("Potential (eV)", fontsize=20)
         plt.title(f"{potential_type} Potential Profile of Ferroelectric Diode", fontsize=25)
-        plt.axvspan(-10,
-                    AtomicUnits.bohr_to_nm(5 * fed.top_screening_len),
-                    facecolor="lightgray",
-                    label="Top Electrode")
-        plt.axvspan(AtomicUnits.bohr_to_nm(5 * fed.top_screening_len),
-                    AtomicUnits.bohr_to_nm(5 * fed.top_screening_len + fed.insulator_thickness),
-                    facecolor="lightsalmon",
-                    label="Insulator")
-        plt.axvspan(AtomicUnits.bohr_to_nm(5 * fed.top_screening_len + fed.insulator_thickness),
-        AtomicUnits.bohr_to_nm(5 * fed.top_screening_len + fed.insulator_thickness + fed.fe_thickness),
-                    facecolor="green",
-                    label="Ferroelectric")
-        plt.axvspan(AtomicUnits.bohr_to_nm(5 * fed.top_screening_len + fed.insulator_thickness + fed.fe_thickness),
-                    AtomicUnits.bohr_to_nm(5 * fed.top_screening_len + fed.barrier_thickness),
-                    facecolor="lightgreen",
-                    label="Dead Layer")
-        plt.axvspan(AtomicUnits.bohr_to_nm(5 * fed.top_screening_len + fed.barrier_thickness),
-                    AtomicUnits.bohr_to_nm(5 * fed.top_screening_len + fed.barrier_thickness + 5 * fed.bottom_screening_len) + 10,
-                    facecolor="lightgray",
-                    label="Bottom Electrode")
+        draw_layer_bands(ax, self.layer_stack)
         plt.plot(x, y, color="k", linewidth=3)
         plt.legend(fontsize=15)
         if potential_type == "Total":
-            top_electrode_x = np.linspace(-10,
-                                          0,
-                                          5)
-            bottom_electrode_x = np.linspace(AtomicUnits.bohr_to_nm(
-                5 * fed.top_screening_len + fed.barrier_thickness + 5 * fed.bottom_screening_len),
-                                           AtomicUnits.bohr_to_nm(
-                                               5 * fed.top_screening_len + fed.barrier_thickness + 5 * fed.bottom_screening_len) + 10,
-                                           5)
-            delta_e = AtomicUnits.hartree_to_ev(self.fed.top_fermi_e - self.fed.bottom_fermi_e + self.v_diff)
-            plt.fill_between(top_electrode_x, 0, AtomicUnits.hartree_to_ev(fed.top_fermi_e))
-            plt.fill_between(bottom_electrode_x, delta_e, delta_e + AtomicUnits.hartree_to_ev(fed.bottom_fermi_e))
+            for (start, end), (low, high) in fermi_level_spans(self):
+                plt.fill_between(np.linspace(start, end, 5), low, high)
 
         plt.show()
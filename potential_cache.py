@@ -0,0 +1,107 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class PotentialCache:
+    def __init__(self, potential, max_entries=4096, v_quantum=1e-9, p_quantum=1e-12):
+        """
+        Memoizing wrapper around a Potential. Position profiles and tunneling currents of its set_vdiff states are
+        cached under the quantized applied voltage, the quantized FE polarization of the state and the diode's
+        geometry/material fingerprint, with LRU eviction. set_vdiff itself is cheaper than any key and is not
+        cached. All other attributes are read from the wrapped Potential, so the wrapper can be passed to
+        SelfConsistentSolver, TunnelingCurrent or rendering.ProfileRenderer in its place.
+        :param max_entries: maximum number of cached profiles, and separately of cached currents
+        :param v_quantum: voltage quantum of the key, in atomic units
+        :param p_quantum: polarization quantum of the key, in atomic units
+        """
+        self.potential = potential
+        self.v_quantum = v_quantum
+        self.p_quantum = p_quantum
+        self.profiles = LRUCache(max_entries)
+        self.currents = LRUCache(max_entries)
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["potential"], name)
+
+    def key(self):
+        """
+        :return: key of the current set_vdiff state, fe_polarization is the polarization that state was computed at
+        """
+        fed = self.potential.fed
+        return (round(self.potential.v_diff / self.v_quantum), round(fed.fe_polarization / self.p_quantum),
+                fed.fingerprint())
+
+    def profile_function(self, potential_type):
+        """
+        Potential.profile_function with the profiles of each state and position array cached.
+        """
+        profile = self.potential.profile_function(potential_type)
+
+        def cached_profile(x):
+            x = np.ascontiguousarray(x, dtype=float)
+            key = self.key() + (potential_type, x.shape, hashlib.sha256(x.tobytes()).digest())
+            values = self.profiles.get(key)
+            if values is None:
+                values = profile(x)
+                self.profiles.put(key, values)
+            return np.copy(values)
+
+        return cached_profile
+
+    def current_density(self, tunneling_current):
+        """
+        :param tunneling_current: tunneling.TunnelingCurrent evaluated at the current state of the wrapped Potential
+        """
+        # the integration grid enters by its positions, so every way of choosing it gets its own entries
+        positions = np.ascontiguousarray(tunneling_current.positions(), dtype=float)
+        settings = (tunneling_current.kt, tunneling_current.num_energies, tunneling_current.energy_window,
+                    hashlib.sha256(positions.tobytes()).digest())
+        key = self.key() + settings
+        current = self.currents.get(key)
+        if current is None:
+            current = tunneling_current.current_density()
+            self.currents.put(key, current)
+        return current
+
+    def stats(self):
+        return {"profiles": self.profiles.stats(), "currents": self.currents.stats()}
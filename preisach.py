@@ -1,5 +1,35 @@
 import numpy as np
-from atomicunits import AtomicUnits
+from units import to_atomic
+
+def domain_parameters(c_a_ratios,
+                      c_a_mean,
+                      c_a_std,
+                      p_s_mean=None,
+                      p_s_std=None,
+                      e_c_mean=None,
+                      e_c_std=None):
+    """
+    Maps c/a ratios to the saturation polarization and coercive field of the domains, both in atomic units.
+    :param c_a_ratios: array of c/a ratios
+    :return: p_s_values, e_c_values
+    """
+    c_a_ratios = np.asarray(c_a_ratios, dtype=float)
+    if p_s_mean is None and p_s_std is None:
+        p_s_values = 333.33 * c_a_ratios - 400
+    else:
+        a = p_s_std / c_a_std  # calculating the coefficients in Y=aX+b through the mean and stdev
+        b = p_s_mean - a * c_a_mean
+        p_s_values = np.abs(a * c_a_ratios + b)  # prevent negative values
+
+    if e_c_mean is None and e_c_std is None:
+        e_c_values = 3.16 * c_a_ratios - 1.1
+    else:
+        a = e_c_std / c_a_std  # calculating the coefficients in Y=aX+b through the mean and stdev
+        b = e_c_mean - a * c_a_mean
+        e_c_values = np.abs(a * c_a_ratios + b)  # prevent negative values
+    # the expressions above are fresh arrays in uC/cm^2 and MV/cm, converted in place
+    return to_atomic(p_s_values, "uC/cm^2", out=p_s_values), to_atomic(e_c_values, "MV/cm", out=e_c_values)
+
 
 class Domain:
     def __init__(self, e_c, polarization, state):
@@ -19,6 +49,174 @@ class Domain:
         return self.state * self.polarization
 
 
+class DomainView:
+    def __init__(self, ferroelectric, index):
+        """
+        Lightweight view of a single domain stored in a Ferroelectric ensemble. Reads and writes go straight
+        to the ensemble arrays.
+        :param ferroelectric: ensemble owning the domain arrays
+        :param index: position of the domain in the ensemble
+        """
+        self._ferroelectric = ferroelectric
+        self._index = index
+
+    @property
+    def e_c(self):
+        return self._ferroelectric.e_c_values[self._index]
+
+    @property
+    def polarization(self):
+        return self._ferroelectric.p_s_values[self._index]
+
+    @property
+    def state(self):
+        return self._ferroelectric.states[self._index]
+
+    @state.setter
+    def state(self, state):
+        self._ferroelectric.set_domain_state(self._index, state)
+
+    def update(self, e_field):
+        original_state = self.state
+        if self.state == 1 and e_field <= -self.e_c:
+            self.state = -1
+        elif self.state == -1 and e_field >= self.e_c:
+            self.state = 1
+        return (self.state - original_state) * self.polarization
+
+    def get_polarization(self):
+        return self.state * self.polarization
+
+
+class DomainList:
+    def __init__(self, ferroelectric):
+        self._ferroelectric = ferroelectric
+
+    def __len__(self):
+        return len(self._ferroelectric.e_c_values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [DomainView(self._ferroelectric, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("domain index out of range")
+        return DomainView(self._ferroelectric, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield DomainView(self._ferroelectric, i)
+
+
+class ThresholdIndex:
+    def __init__(self, e_c_values, weights, states):
+        """
+        Sorted coercive-field index over symmetric hysterons with strictly positive coercive fields. Sorted by e_c,
+        the hysteron states form runs of equal sign, and a field E overwrites every hysteron with e_c <= |E| with
+        sign(E). An update is therefore a binary search plus popping the runs it covers, O(log N + runs covered),
+        and the weighted polarization total is adjusted in place.
+        :param e_c_values: coercive field of each hysteron
+        :param weights: polarization weight of each hysteron
+        :param states: initial state (+1/-1) of each hysteron
+        """
+        self.order = np.argsort(e_c_values, kind="stable")
+        self.sorted_e_c = e_c_values[self.order]
+        self.cum_weights = np.concatenate(([0.0], np.cumsum(weights[self.order])))
+        self.runs = []  # (start, sign) pairs, the run with the lowest coercive fields is last
+        self.total = 0.0
+        self.rebuild(states)
+
+    def rebuild(self, states):
+        sorted_states = states[self.order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_states)) + 1))
+        ends = np.append(starts[1:], len(sorted_states))
+        signs = sorted_states[starts].astype(np.int64)
+        self.runs = [(int(start), int(sign)) for start, sign in zip(starts[::-1], signs[::-1])]
+        self.total = float(np.sum(signs * (self.cum_weights[ends] - self.cum_weights[starts])))
+
+    def set_runs(self, runs):
+        self.runs = [(int(start), int(sign)) for start, sign in runs]
+        self.total = 0.0
+        end = len(self.sorted_e_c)
+        for start, sign in self.runs:
+            self.total += sign * (self.cum_weights[end] - self.cum_weights[start])
+            end = start
+
+    def states(self):
+        sorted_states = np.empty(len(self.sorted_e_c), dtype=np.int8)
+        end = len(sorted_states)
+        for start, sign in self.runs:
+            sorted_states[start:end] = sign
+            end = start
+        states = np.empty_like(sorted_states)
+        states[self.order] = sorted_states
+        return states
+
+    def _prefix(self, e_field):
+        if e_field == 0:
+            return 0, 0
+        return int(np.searchsorted(self.sorted_e_c, abs(e_field), side="right")), 1 if e_field > 0 else -1
+
+    def preview(self, e_field):
+        """
+        :return: change of the weighted polarization total if e_field were applied, without applying it
+        """
+        k, sign = self._prefix(e_field)
+        change = 0.0
+        for i in range(len(self.runs) - 1, -1, -1):
+            start, run_sign = self.runs[i]
+            if start >= k:
+                break
+            end = self.runs[i - 1][0] if i > 0 else len(self.sorted_e_c)
+            if run_sign != sign:
+                change += 2 * sign * (self.cum_weights[min(end, k)] - self.cum_weights[start])
+        return change
+
+    def next_thresholds(self):
+        """
+        :return: lowest field that switches any hysteron up (inf if none is down) and highest field that switches
+        any hysteron down (-inf if none is up)
+        """
+        lowest = {}
+        for start, sign in self.runs[-2:]:
+            lowest[sign] = self.sorted_e_c[start]  # runs alternate in sign, the later one is lower
+        return lowest.get(-1, np.inf), -lowest.get(1, np.inf)
+
+    def apply(self, e_field, states=None):
+        """
+        Applies e_field to the hysterons.
+        :param states: optional array of unsorted states to keep in sync with the switched hysterons
+        :return: change of the weighted polarization total and number of switched hysterons
+        """
+        k, sign = self._prefix(e_field)
+        if k == 0:
+            return 0.0, 0
+        n = len(self.sorted_e_c)
+        runs = self.runs
+        change = 0.0
+        switched = 0
+        while runs:
+            start, run_sign = runs[-1]
+            end = runs[-2][0] if len(runs) > 1 else n
+            stop = min(end, k)
+            if run_sign != sign:
+                change += 2 * sign * (self.cum_weights[stop] - self.cum_weights[start])
+                switched += stop - start
+                if states is not None:
+                    states[self.order[start:stop]] = sign
+            if end > k:
+                runs[-1] = (k, run_sign)
+                break
+            runs.pop()
+        if runs and runs[-1][1] == sign:
+            runs[-1] = (0, sign)
+        else:
+            runs.append((0, sign))
+        self.total += change
+        return change, switched
+
+
 class Ferroelectric:
     def __init__(self,
                  num_domains,
@@ -28,42 +226,618 @@ class Ferroelectric:
                  p_s_std=None,
                  e_c_mean=None,
                  e_c_std=None,
-                 seed=0):
-        np.random.seed(seed)
-        c_a_ratios = np.random.normal(loc=c_a_mean, scale=c_a_std, size=num_domains)
-        if p_s_mean is None and p_s_std is None:
-            p_s_values = AtomicUnits.convert_polarization(333.33 * c_a_ratios - 400)
+                 seed=0,
+                 rng=None):
+        """
+        :param seed: seed of the global NumPy random state, used when rng is None
+        :param rng: optional np.random.Generator to sample the c/a ratios from instead of the global random state
+        """
+        if rng is None:
+            np.random.seed(seed)
+            c_a_ratios = np.random.normal(loc=c_a_mean, scale=c_a_std, size=num_domains)
         else:
-            a = p_s_std / c_a_std  # calculating the coefficients in Y=aX+b through the mean and stdev
-            b = p_s_mean - a * c_a_mean
-            p_s_values = AtomicUnits.convert_polarization(abs(a * c_a_ratios + b))  # prevent negative values
+            c_a_ratios = rng.normal(loc=c_a_mean, scale=c_a_std, size=num_domains)
+        p_s_values, e_c_values = domain_parameters(c_a_ratios, c_a_mean, c_a_std, p_s_mean, p_s_std, e_c_mean, e_c_std)
+        self._set_domains(c_a_ratios, p_s_values, e_c_values)
 
-        if e_c_mean is None and e_c_std is None:
-            e_c_values = AtomicUnits.Mv_per_cm_to_atomic_units(3.16 * c_a_ratios - 1.1)
-        else:
-            a = e_c_std / c_a_std  # calculating the coefficients in Y=aX+b through the mean and stdev
-            b = e_c_mean - a * c_a_mean
-            e_c_values = AtomicUnits.Mv_per_cm_to_atomic_units(abs(a * c_a_ratios + b))  # prevent negative values
-        self.domains = []
-        for i in range(num_domains):
-            self.domains.append(Domain(e_c=e_c_values[i], polarization=p_s_values[i], state=1))
+    @classmethod
+    def from_arrays(cls, p_s_values, e_c_values, c_a_ratios=None):
+        """
+        Builds an ensemble from precomputed domain parameters, all domains start in the up state.
+        """
+        ferroelectric = cls.__new__(cls)
+        ferroelectric._set_domains(c_a_ratios, p_s_values, e_c_values)
+        return ferroelectric
 
+    def _set_domains(self, c_a_ratios, p_s_values, e_c_values):
         self.c_a_ratios = c_a_ratios
-        self.p_s_values = p_s_values
-        self.e_c_values = e_c_values
+        self.p_s_values = np.ascontiguousarray(p_s_values, dtype=np.float64)
+        self.e_c_values = np.ascontiguousarray(e_c_values, dtype=np.float64)
+        self.domains = DomainList(self)
+
+        num_domains = len(self.e_c_values)
+        initial_states = np.ones(num_domains, dtype=np.int8)
+        if num_domains > 0 and np.all(self.e_c_values > 0):
+            self._index = ThresholdIndex(self.e_c_values, self.p_s_values, initial_states)
+            self._states = None  # materialized from the index on first access
+        else:
+            self._index = None  # zero or negative e_c domains flip on every update, use the dense update
+            self._states = initial_states
+        self._index_stale = False
+        self.last_switched = 0  # domains switched by the last update
+
+    @property
+    def states(self):
+        if self._states is None:
+            self._states = self._index.states()
+        states = self._states.view()
+        states.flags.writeable = False
+        return states
+
+    def set_domain_state(self, index, state):
+        self.states  # materialize before writing
+        self._states[index] = state
+        self._index_stale = self._index is not None
+
+    def _sync_index(self):
+        if self._index_stale:
+            self._index.rebuild(self._states)
+            self._index_stale = False
 
     def update(self, e_field):
-        p_change_sum = 0
-        for domain in self.domains:
-            p_change_sum += domain.update(e_field)
-        return p_change_sum / len(self.domains)
+        if self._index is None:
+            switch_down = (self._states == 1) & (e_field <= -self.e_c_values)
+            switch_up = (self._states == -1) & (e_field >= self.e_c_values)
+            self._states[switch_down] = -1
+            self._states[switch_up] = 1
+            self.last_switched = int(np.count_nonzero(switch_down) + np.count_nonzero(switch_up))
+            p_change_sum = 2 * (self.p_s_values[switch_up].sum() - self.p_s_values[switch_down].sum())
+            return p_change_sum / len(self.e_c_values)
+        self._sync_index()
+        p_change_sum, self.last_switched = self._index.apply(e_field, self._states)
+        return p_change_sum / len(self.e_c_values)
+
+    def preview(self, e_field):
+        """
+        :return: the polarization change update(e_field) would return, without switching any domain
+        """
+        if self._index is None:
+            switch_down = (self._states == 1) & (e_field <= -self.e_c_values)
+            switch_up = (self._states == -1) & (e_field >= self.e_c_values)
+            return 2 * (self.p_s_values[switch_up].sum() - self.p_s_values[switch_down].sum()) / len(self.e_c_values)
+        self._sync_index()
+        return self._index.preview(e_field) / len(self.e_c_values)
+
+    def switching_fields(self):
+        """
+        :return: sorted coercive fields, or None if the ensemble has no threshold index
+        """
+        return None if self._index is None else self._index.sorted_e_c
+
+    def next_thresholds(self):
+        """
+        :return: lowest field that switches any domain up (inf if none is down) and highest field that switches any
+        domain down (-inf if none is up), O(1) with a threshold index
+        """
+        if self._index is None:
+            down, up = self._states == -1, self._states == 1
+            return (self.e_c_values[down].min() if down.any() else np.inf,
+                    -self.e_c_values[up].min() if up.any() else -np.inf)
+        self._sync_index()
+        return self._index.next_thresholds()
+
+    def get_state(self):
+        """
+        :return: dict of arrays that determines the domain states, O(runs) with a threshold index
+        """
+        if self._index is None:
+            return {"states": self._states.copy()}
+        self._sync_index()
+        return {"runs": np.array(self._index.runs, dtype=np.int64).reshape(-1, 2)}
+
+    def set_state(self, state):
+        if "runs" in state:
+            self._index.set_runs(state["runs"])
+            self._states = None
+            self._index_stale = False
+        else:
+            self._states = np.array(state["states"], dtype=np.int8)
+            self._index_stale = self._index is not None
 
     def avg_polarization(self):
-        p_sum = 0
-        for domain in self.domains:
-            p_sum += domain.get_polarization()
-        return p_sum / len(self.domains)
+        if self._index is None:
+            return np.dot(self._states, self.p_s_values) / len(self.e_c_values)
+        self._sync_index()
+        return self._index.total / len(self.e_c_values)
+
+
+class HistogramFerroelectric(Ferroelectric):
+    def __init__(self,
+                 num_domains,
+                 c_a_mean,
+                 c_a_std,
+                 p_s_mean=None,
+                 p_s_std=None,
+                 e_c_mean=None,
+                 e_c_std=None,
+                 num_bins=None,
+                 tolerance=0.05,
+                 seed=0,
+                 rng=None,
+                 chunk_size=2 ** 20,
+                 quadrature_points=100001):
+        """
+        Ferroelectric compressed to a histogram over the coercive field. The domains are sampled in chunks, as
+        Ferroelectric would sample them with the same seed or rng, and accumulated into bins of equal expected p_s
+        weight. Each bin keeps its domain count, summed p_s and e_c range, and switches as one hysteron at its mean
+        e_c, so memory and update cost depend on the number of bins only.
+
+        A field E can only leave the bin whose e_c range contains |E| partially switched in the exact ensemble, so
+        the histogram differs from the exact ensemble in at most one bin per reversal point still remembered by the
+        history. These bins are tracked and error_bound() returns the resulting bound on the polarization error.
+        :param num_bins: number of e_c bins, by default the smallest number for which one bin is worth at most
+        tolerance
+        :param tolerance: polarization error (uc/cm^2) allowed per remembered reversal point, used when num_bins is
+        None
+        :param chunk_size: number of domains sampled at once
+        :param quadrature_points: number of points used to integrate the bin edges over the c/a distribution
+        """
+        z = np.linspace(-8, 8, quadrature_points)
+        weights = np.exp(-z ** 2 / 2)
+        weights /= weights.sum()
+        p_s_grid, e_c_grid = domain_parameters(c_a_mean + c_a_std * z, c_a_mean, c_a_std,
+                                               p_s_mean, p_s_std, e_c_mean, e_c_std)
+        order = np.argsort(e_c_grid, kind="stable")
+        cum_p_s = np.cumsum(weights[order] * np.abs(p_s_grid[order]))
+        if num_bins is None:
+            num_bins = int(np.ceil(2 * cum_p_s[-1] / to_atomic(tolerance, "uC/cm^2")))
+        edges = np.interp(np.linspace(0, 1, num_bins + 1)[1:-1], cum_p_s / cum_p_s[-1], e_c_grid[order])
+
+        counts = np.zeros(num_bins, dtype=np.int64)
+        p_s_sums = np.zeros(num_bins)
+        e_c_sums = np.zeros(num_bins)
+        e_c_min = np.full(num_bins, np.inf)
+        e_c_max = np.full(num_bins, -np.inf)
+        if rng is None:
+            np.random.seed(seed)
+        for start in range(0, num_domains, chunk_size):
+            size = min(chunk_size, num_domains - start)
+            if rng is None:
+                c_a_ratios = np.random.normal(loc=c_a_mean, scale=c_a_std, size=size)
+            else:
+                c_a_ratios = rng.normal(loc=c_a_mean, scale=c_a_std, size=size)
+            p_s_values, e_c_values = domain_parameters(c_a_ratios, c_a_mean, c_a_std,
+                                                       p_s_mean, p_s_std, e_c_mean, e_c_std)
+            bins = np.searchsorted(edges, e_c_values, side="right")
+            counts += np.bincount(bins, minlength=num_bins)
+            p_s_sums += np.bincount(bins, weights=p_s_values, minlength=num_bins)
+            e_c_sums += np.bincount(bins, weights=e_c_values, minlength=num_bins)
+            np.minimum.at(e_c_min, bins, e_c_values)
+            np.maximum.at(e_c_max, bins, e_c_values)
+
+        occupied = counts > 0
+        self.num_domains = num_domains
+        self.counts = counts[occupied]
+        self.p_s_sums = p_s_sums[occupied]
+        self.e_c_min = e_c_min[occupied]
+        self.e_c_max = e_c_max[occupied]
+        # one hysteron per bin, weighted so that the averages over bins equal the averages over domains
+        num_occupied = len(self.counts)
+        self._set_domains(None, self.p_s_sums * (num_occupied / num_domains), e_c_sums[occupied] / self.counts)
+        self._cum_counts = None if self._index is None else \
+            np.concatenate(([0], np.cumsum(self.counts[self._index.order])))
+        self._dirty = []  # indices of bins that may be partially switched, the lowest e_c last
 
+    def up_count(self):
+        """
+        :return: number of domains in the up state
+        """
+        if self._index is None:
+            return int(self.counts[self._states == 1].sum())
+        self._sync_index()
+        up = 0
+        end = len(self.counts)
+        for start, sign in self._index.runs:
+            if sign == 1:
+                up += self._cum_counts[end] - self._cum_counts[start]
+            end = start
+        return int(up)
 
+    def down_count(self):
+        return self.num_domains - self.up_count()
 
+    def up_counts(self):
+        """
+        :return: number of up domains in each bin
+        """
+        return np.where(self.states == 1, self.counts, 0)
 
+    def update(self, e_field):
+        up = self.up_count()
+        p_change = super().update(e_field)
+        self.last_switched = abs(self.up_count() - up)  # all switches of an update go the same way
+
+        # bins entirely below |E| now agree with the exact ensemble, the bin containing |E| may not
+        e_field = abs(e_field)
+        dirty = self._dirty
+        while dirty and self.e_c_max[dirty[-1]] <= e_field:
+            dirty.pop()
+        i = int(np.searchsorted(self.e_c_min, e_field, side="right")) - 1
+        if i >= 0 and e_field < self.e_c_max[i] and not (dirty and dirty[-1] == i):
+            dirty.append(i)
+        return p_change
+
+    def error_bound(self):
+        """
+        :return: bound on |avg_polarization() - avg_polarization of the exact ensemble| after the same field history
+        """
+        return 2 * float(np.abs(self.p_s_sums[self._dirty]).sum()) / self.num_domains
+
+    def get_state(self):
+        state = super().get_state()
+        state["dirty"] = np.array(self._dirty, dtype=np.int64)
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self._dirty = [int(i) for i in state.get("dirty", ())]
+
+
+class ContinuumFerroelectric:
+    def __init__(self,
+                 c_a_mean,
+                 c_a_std,
+                 p_s_mean=None,
+                 p_s_std=None,
+                 e_c_mean=None,
+                 e_c_std=None,
+                 grid_points=256,
+                 quadrature_points=4001):
+        """
+        Continuum limit of Ferroelectric. The c/a distribution is integrated once into an Everett table on a grid
+        of (alpha, beta) switching thresholds, and the input history is reduced to its staircase of dominant
+        extrema. Polarization is a handful of table lookups, independent of the number of domains.
+        :param grid_points: number of positive thresholds in the grid, the table has (2 * grid_points)^2 entries
+        :param quadrature_points: number of points used to integrate over the c/a distribution
+        """
+        z = np.linspace(-8, 8, quadrature_points)
+        weights = np.exp(-z ** 2 / 2)
+        weights /= weights.sum()
+        p_s_values, e_c_values = domain_parameters(c_a_mean + c_a_std * z, c_a_mean, c_a_std,
+                                                   p_s_mean, p_s_std, e_c_mean, e_c_std)
+        e_c_values = np.maximum(e_c_values, 0)  # a hysteron needs alpha >= beta
+
+        order = np.argsort(e_c_values, kind="stable")
+        sorted_e_c = e_c_values[order]
+        cum_weights = np.cumsum(weights[order])
+        cum_p_s = np.cumsum(weights[order] * p_s_values[order])
+        self.p_s_total = cum_p_s[-1]
+
+        # thresholds at equal quantiles of the coercive field, refined by a uniform grid in the tails, mirrored
+        # for the down-switching side
+        thresholds = np.unique(np.concatenate((
+            np.interp(np.linspace(0, 1, grid_points - grid_points // 2), cum_weights, sorted_e_c),
+            np.linspace(sorted_e_c[0], sorted_e_c[-1], grid_points // 2))))
+        self.fields = np.unique(np.concatenate((-thresholds, thresholds)))
+        switchable = np.interp(self.fields, sorted_e_c, cum_p_s, left=0, right=self.p_s_total)
+
+        # E(alpha, beta) is the weight of hysterons with beta <= -e_c and e_c <= alpha
+        n = len(self.fields)
+        alpha = np.arange(n)[:, None]
+        beta = np.arange(n)[None, :]
+        self.everett_table = np.where(alpha >= beta, switchable[np.minimum(alpha, n - 1 - beta)], 0.0)
+
+        self._maxima = [np.inf]  # dominant maxima, starting from positive saturation
+        self._minima = []  # dominant minima
+        self._polarization = self.p_s_total
+
+    def everett(self, alpha, beta):
+        """
+        Bilinear lookup of the Everett function, inputs outside the grid are clamped to its edges.
+        """
+        n = len(self.fields)
+        a = np.interp(alpha, self.fields, np.arange(n))
+        b = np.interp(beta, self.fields, np.arange(n))
+        i = np.minimum(a.astype(np.int64), n - 2)
+        j = np.minimum(b.astype(np.int64), n - 2)
+        fa = a - i
+        fb = b - j
+        table = self.everett_table
+        return ((1 - fa) * (1 - fb) * table[i, j] + fa * (1 - fb) * table[i + 1, j] +
+                (1 - fa) * fb * table[i, j + 1] + fa * fb * table[i + 1, j + 1])
+
+    def _push(self, e_field):
+        maxima, minima = self._maxima, self._minima
+        last_is_max = len(maxima) > len(minima)
+        last = maxima[-1] if last_is_max else minima[-1]
+        if e_field == last:
+            return
+        if e_field > last:
+            if last_is_max:
+                maxima.pop()
+            while maxima[-1] <= e_field:  # wipe out dominated extrema, maxima[0] is +inf
+                maxima.pop()
+                minima.pop()
+            maxima.append(e_field)
+        else:
+            if not last_is_max:
+                minima.pop()
+            while minima and minima[-1] >= e_field:
+                minima.pop()
+                maxima.pop()
+            minima.append(e_field)
+
+    def _staircase_polarization(self):
+        maxima = np.array(self._maxima)
+        minima = np.array(self._minima)
+        down = (np.sum(self.everett(maxima[:len(minima)], minima)) -
+                np.sum(self.everett(maxima[1:], minima[:len(maxima) - 1])))
+        return self.p_s_total - 2 * down
+
+    def update(self, e_field):
+        self._push(e_field)
+        polarization = self._staircase_polarization()
+        p_change = polarization - self._polarization
+        self._polarization = polarization
+        return p_change
+
+    def preview(self, e_field):
+        """
+        :return: the polarization change update(e_field) would return, without changing the history
+        """
+        maxima, minima = self._maxima, self._minima
+        self._maxima, self._minima = list(maxima), list(minima)
+        try:
+            self._push(e_field)
+            return self._staircase_polarization() - self._polarization
+        finally:
+            self._maxima, self._minima = maxima, minima
+
+    def get_state(self):
+        return {"maxima": np.array(self._maxima), "minima": np.array(self._minima)}
+
+    def set_state(self, state):
+        self._maxima = [float(value) for value in state["maxima"]]
+        self._minima = [float(value) for value in state["minima"]]
+        self._polarization = self._staircase_polarization()
+
+    def avg_polarization(self):
+        return self._polarization
+
+
+class FerroelectricEnsemble:
+    def __init__(self,
+                 num_realizations,
+                 num_domains,
+                 c_a_mean,
+                 c_a_std,
+                 p_s_mean=None,
+                 p_s_std=None,
+                 e_c_mean=None,
+                 e_c_std=None,
+                 seed=0,
+                 seeds=None):
+        """
+        Independent realizations of Ferroelectric stored as rows of (R, N) arrays, so they can be advanced
+        together. Row r holds the same domains as Ferroelectric(num_domains, ..., seed=seeds[r]).
+        :param num_realizations: number of realizations R
+        :param seeds: seed of each realization, defaults to seed, seed + 1, ..., seed + R - 1
+        """
+        if seeds is None:
+            seeds = range(seed, seed + num_realizations)
+        self.seeds = list(seeds)
+        if len(self.seeds) != num_realizations:
+            raise ValueError("expected one seed per realization")
+
+        self.c_a_ratios = np.empty((num_realizations, num_domains))
+        self.p_s_values = np.empty((num_realizations, num_domains))
+        self.e_c_values = np.empty((num_realizations, num_domains))
+        for r, realization_seed in enumerate(self.seeds):
+            np.random.seed(realization_seed)
+            self.c_a_ratios[r] = np.random.normal(loc=c_a_mean, scale=c_a_std, size=num_domains)
+            self.p_s_values[r], self.e_c_values[r] = domain_parameters(self.c_a_ratios[r], c_a_mean, c_a_std,
+                                                                       p_s_mean, p_s_std, e_c_mean, e_c_std)
+        self.states = np.ones((num_realizations, num_domains), dtype=np.int8)
+        self._p_sums = self.p_s_values.sum(axis=1)
+
+    @property
+    def num_realizations(self):
+        return self.states.shape[0]
+
+    def update(self, e_fields, rows=None):
+        """
+        :param e_fields: field seen by each realization, or by each of the selected rows
+        :param rows: optional indices of the realizations to update
+        :return: average polarization change of each updated realization
+        """
+        e_fields = np.asarray(e_fields, dtype=float)
+        if rows is None:
+            states, e_c_values, p_s_values = self.states, self.e_c_values, self.p_s_values
+        else:
+            states, e_c_values, p_s_values = self.states[rows], self.e_c_values[rows], self.p_s_values[rows]
+        e_fields = np.broadcast_to(e_fields, (states.shape[0],))[:, None]
+        switch_down = (states == 1) & (e_fields <= -e_c_values)
+        switch_up = (states == -1) & (e_fields >= e_c_values)
+        states[switch_down] = -1
+        states[switch_up] = 1
+        p_change_sums = 2 * (np.where(switch_up, p_s_values, 0).sum(axis=1) -
+                             np.where(switch_down, p_s_values, 0).sum(axis=1))
+        if rows is None:
+            self._p_sums += p_change_sums
+        else:
+            self.states[rows] = states
+            self._p_sums[rows] += p_change_sums
+        return p_change_sums / states.shape[1]
+
+    def avg_polarization(self):
+        """
+        :return: average polarization of each realization
+        """
+        return self._p_sums / self.states.shape[1]
+
+    def get_state(self):
+        return {"states": self.states.copy()}
+
+    def set_state(self, state):
+        self.states = np.array(state["states"], dtype=np.int8)
+        self._p_sums = np.einsum("ij,ij->i", self.states, self.p_s_values)
+
+
+class LatticeFerroelectric:
+    def __init__(self,
+                 shape,
+                 c_a_mean,
+                 c_a_std,
+                 p_s_mean=None,
+                 p_s_std=None,
+                 e_c_mean=None,
+                 e_c_std=None,
+                 coupling=0.0,
+                 depolarization=0.0,
+                 kernel=None,
+                 max_sweeps=10000,
+                 seed=0,
+                 rng=None):
+        """
+        Domains on a periodic 2D lattice. Each domain sees the applied field plus an interaction field
+        h_i = sum_j K(r_i - r_j) m_j, where m_j = state_j * p_s_j / mean(p_s). An update relaxes the lattice as an
+        avalanche: domains whose local field crosses their coercive field switch, the interaction field is updated
+        and the switching repeats until the lattice is stable. This reproduces nucleation and domain-wall motion
+        that the mean-field Ferroelectric cannot. With zero interaction the lattice matches Ferroelectric with the
+        same domains (same seed or rng).
+
+        A nearest-neighbour-only interaction is applied as a sparse stencil, so every avalanche round only
+        touches the neighbours of the domains that just switched. Any long-range term uses FFT convolution.
+        :param shape: (rows, columns) of the lattice
+        :param coupling: field (MV/cm) a neighbour aligned with its domain adds, positive favours aligned walls
+        :param depolarization: strength (MV/cm) of the dipolar field -depolarization / r^3 of every other domain,
+        r in lattice spacings
+        :param kernel: optional additional interaction kernel (MV/cm) of the lattice shape, origin at [0, 0]
+        :param max_sweeps: limit of avalanche rounds per update
+        """
+        self.shape = tuple(shape)
+        num_domains = self.shape[0] * self.shape[1]
+        if rng is None:
+            np.random.seed(seed)
+            c_a_ratios = np.random.normal(loc=c_a_mean, scale=c_a_std, size=num_domains)
+        else:
+            c_a_ratios = rng.normal(loc=c_a_mean, scale=c_a_std, size=num_domains)
+        self.p_s_values, self.e_c_values = domain_parameters(c_a_ratios, c_a_mean, c_a_std,
+                                                             p_s_mean, p_s_std, e_c_mean, e_c_std)
+        self.p_s_mean = float(np.mean(self.p_s_values))
+        self.coupling = to_atomic(coupling, "MV/cm")
+        self.max_sweeps = max_sweeps
+
+        self._kernel_fft = None
+        if depolarization or kernel is not None:
+            rows, columns = self.shape
+            dy = np.minimum(np.arange(rows), rows - np.arange(rows))[:, None]
+            dx = np.minimum(np.arange(columns), columns - np.arange(columns))[None, :]
+            r = np.hypot(dy, dx)
+            full_kernel = -to_atomic(depolarization, "MV/cm") * np.divide(1.0, r ** 3, out=np.zeros(self.shape),
+                                                                          where=r > 0)
+            for row, column in ((1, 0), (-1, 0), (0, 1), (0, -1)):  # nearest neighbours
+                full_kernel[row % rows, column % columns] += self.coupling
+            if kernel is not None:
+                full_kernel += to_atomic(np.asarray(kernel, dtype=float), "MV/cm")
+            self._kernel_fft = np.fft.rfft2(full_kernel)
+
+        self.states = np.ones(num_domains, dtype=np.int8)
+        self.last_switched = 0
+        self._set_fields()
+
+    @property
+    def num_domains(self):
+        return len(self.states)
+
+    def _moments(self):
+        return self.states * self.p_s_values / self.p_s_mean
+
+    def _set_fields(self):
+        self._total = float(np.dot(self.states, self.p_s_values))
+        if self._kernel_fft is not None:
+            moments = self._moments().reshape(self.shape)
+            self.interaction = np.fft.irfft2(np.fft.rfft2(moments) * self._kernel_fft, s=self.shape).reshape(-1)
+        else:
+            moments = self._moments().reshape(self.shape)
+            neighbours = np.roll(moments, 1, 0) + np.roll(moments, -1, 0) + \
+                np.roll(moments, 1, 1) + np.roll(moments, -1, 1)
+            self.interaction = self.coupling * neighbours.reshape(-1)
+
+    def _neighbours(self, indices):
+        rows, columns = self.shape
+        row, column = np.divmod(indices, columns)
+        return np.concatenate((((row + 1) % rows) * columns + column, ((row - 1) % rows) * columns + column,
+                               row * columns + (column + 1) % columns, row * columns + (column - 1) % columns))
+
+    def update(self, e_field):
+        """
+        Relaxes the lattice at the applied field e_field.
+        :return: change of the average polarization
+        """
+        states, e_c_values = self.states, self.e_c_values
+        candidates = None  # all domains
+        switched = 0
+        total = self._total
+        for _ in range(self.max_sweeps):
+            if candidates is None:
+                local = e_field + self.interaction
+                flips = np.flatnonzero(((states == -1) & (local >= e_c_values)) |
+                                       ((states == 1) & (local <= -e_c_values)))
+            else:
+                local = e_field + self.interaction[candidates]
+                s, e_c = states[candidates], e_c_values[candidates]
+                flips = candidates[((s == -1) & (local >= e_c)) | ((s == 1) & (local <= -e_c))]
+            if len(flips) == 0:
+                break
+            states[flips] *= -1
+            switched += len(flips)
+            delta = 2 * states[flips] * self.p_s_values[flips]
+            total += delta.sum()
+            if self._kernel_fft is not None:
+                self._set_fields()
+                candidates = None
+            else:
+                neighbours = self._neighbours(flips)
+                np.add.at(self.interaction, neighbours, np.tile(self.coupling * delta / self.p_s_mean, 4))
+                candidates = np.unique(neighbours)
+        p_change = (total - self._total) / self.num_domains
+        self._total = total
+        self.last_switched = switched
+        return p_change
+
+    def preview(self, e_field):
+        """
+        :return: the polarization change update(e_field) would return, without changing the lattice
+        """
+        states, interaction, total, last_switched = \
+            self.states.copy(), self.interaction.copy(), self._total, self.last_switched
+        try:
+            return self.update(e_field)
+        finally:
+            self.states, self.interaction, self._total, self.last_switched = states, interaction, total, last_switched
+
+    def next_thresholds(self):
+        """
+        :return: lowest applied field that switches any domain up (inf if none is down) and highest applied field
+        that switches any domain down (-inf if none is up), from the coercive and interaction fields
+        """
+        down, up = self.states == -1, self.states == 1
+        return ((self.e_c_values[down] - self.interaction[down]).min() if down.any() else np.inf,
+                (-self.e_c_values[up] - self.interaction[up]).max() if up.any() else -np.inf)
+
+    def get_state(self):
+        return {"states": self.states.copy()}
+
+    def set_state(self, state):
+        self.states = np.array(state["states"], dtype=np.int8).reshape(-1)
+        self._set_fields()
+
+    def lattice(self):
+        """
+        :return: domain states as a (rows, columns) array
+        """
+        return self.states.reshape(self.shape)
+
+    def avg_polarization(self):
+        return self._total / self.num_domains
@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+
+from atomicunits import AtomicUnits
+from mesh import adaptive_mesh
+
+LAYER_COLORS = {"insulator": "lightsalmon", "ferroelectric": "green", "dead_layer": "lightgreen"}
+ELECTRODE_COLOR = "lightgray"
+
+
+def draw_layer_bands(ax, layer_stack, margin=10):
+    """
+    Shades the electrodes and every layer of the stack on ax, positions in nm.
+    :param margin: width (nm) of the electrode bulk shown beyond the screening regions
+    """
+    b = AtomicUnits.bohr_to_nm(layer_stack.boundaries)
+    ax.axvspan(b[0] - margin, b[1], facecolor=ELECTRODE_COLOR, label="Top Electrode")
+    for name, kind, start, end in zip(layer_stack.names, layer_stack.kinds, b[1:-2], b[2:-1]):
+        ax.axvspan(start, end, facecolor=LAYER_COLORS.get(kind, "lightblue"), label=name)
+    ax.axvspan(b[-2], b[-1] + margin, facecolor=ELECTRODE_COLOR, label="Bottom Electrode")
+
+
+def fermi_level_spans(potential, margin=10):
+    """
+    :return: ((x start, x end), (energy low, energy high)) in nm and eV of the occupied bands of the top and bottom
+    electrode bulk
+    """
+    fed = potential.fed
+    b = AtomicUnits.bohr_to_nm(potential.layer_boundaries)
+    delta_e = AtomicUnits.hartree_to_ev(fed.top_fermi_e - fed.bottom_fermi_e + potential.v_diff)
+    return (((b[0] - margin, b[0]), (0, AtomicUnits.hartree_to_ev(fed.top_fermi_e))),
+            ((b[-1], b[-1] + margin), (delta_e, delta_e + AtomicUnits.hartree_to_ev(fed.bottom_fermi_e))))
+
+
+class ProfileRenderer:
+    def __init__(self, potential, potential_type="Total", x=None, ylim=None, figsize=(15, 10), dpi=120, margin=10):
+        """
+        Off-screen renderer of potential profiles on the Agg backend, without pyplot. The figure, axes, layer bands
+        and legend are built once; each frame only replaces the profile line data, the bottom electrode band and
+        the label, so rendering a sweep costs one line update and one draw per frame.
+        :param potential: Potential to render, its current set_vdiff state is drawn
+        :param potential_type: "Electrostatic", "Barrier", "Built-in" or "Total"
+        :param x: positions (bohr), mesh.adaptive_mesh of the stack with the margin by default
+        :param ylim: fixed (low, high) potential range in eV, rescaled to every frame if None
+        :param margin: width (nm) of the electrode bulk shown beyond the screening regions
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.patches import Rectangle
+
+        self.potential = potential
+        self.potential_type = potential_type
+        self.x = adaptive_mesh(potential.layer_stack, margin=AtomicUnits.nm_to_bohr(margin)) if x is None else \
+            np.asarray(x, dtype=float)
+        self.ylim = ylim
+        self.margin = margin
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.axes = self.figure.add_subplot()
+        ax.set_xlabel("Position (nm)", fontsize=20)
+        ax.set_ylabel("Potential (eV)", fontsize=20)
+        ax.set_title(f"{potential_type} Potential Profile of Ferroelectric Diode", fontsize=25)
+        draw_layer_bands(ax, potential.layer_stack, margin)
+        self.line, = ax.plot(AtomicUnits.bohr_to_nm(self.x), np.zeros(len(self.x)), color="k", linewidth=3)
+        ax.legend(fontsize=15, loc="upper right")
+        self.fermi_levels = []
+        if potential_type == "Total":
+            for (start, end), (low, high) in fermi_level_spans(potential, margin):
+                self.fermi_levels.append(ax.add_patch(Rectangle((start, low), end - start, high - low,
+                                                                facecolor=f"C{len(self.fermi_levels)}")))
+        self.label = ax.text(0.02, 0.97, "", transform=ax.transAxes, fontsize=15, va="top")
+        self.update()
+
+    def update(self, label=""):
+        """
+        Redraws the profile line from the current state of the potential.
+        """
+        self.line.set_ydata(AtomicUnits.hartree_to_ev(self.potential.profile_function(self.potential_type)(self.x)))
+        for patch, (_, (low, high)) in zip(self.fermi_levels, fermi_level_spans(self.potential, self.margin)):
+            patch.set_y(low)
+            patch.set_height(high - low)
+        self.label.set_text(label)
+        if self.ylim is None:
+            self.axes.relim()
+            self.axes.autoscale_view(scalex=False)
+        else:
+            self.axes.set_ylim(*self.ylim)
+
+    def frames(self, voltages, solver=None):
+        """
+        :param voltages: applied voltages (V) of the frames
+        :param solver: optional SelfConsistentSolver of the potential, solved at each voltage so the domain state
+        follows the sweep. Without it only the applied voltage changes.
+        :return: generator of the voltage of each frame, after its profile has been drawn
+        """
+        for v in voltages:
+            if solver is None:
+                self.potential.set_vdiff(AtomicUnits.convert_volts(v))
+                self.update(f"V = {v:.3f} V")
+            else:
+                polarization, _ = solver.solve(v)
+                # the strategy may leave the potential at the polarization before its last update
+                self.potential.set_vdiff(AtomicUnits.convert_volts(v))
+                self.update(f"V = {v:.3f} V, P = {AtomicUnits.convert_back_polarization(polarization):.2f} uC/cm$^2$")
+            yield v
+
+    def save(self, path):
+        self.figure.savefig(path)
+
+    def write(self, path, voltages, solver=None, fps=10):
+        """
+        Renders one frame per voltage straight to disk. The format follows path: "*.pdf" writes a multi-page PDF,
+        "*.gif" and "*.mp4" an animation (Pillow and ffmpeg writers), any other path is a pattern for one image per
+        frame formatted with the frame index, e.g. "frames/profile_{:05d}.png".
+        :return: number of frames written
+        """
+        extension = os.path.splitext(path)[1].lower()
+        count = 0
+        if extension == ".pdf":
+            from matplotlib.backends.backend_pdf import PdfPages
+
+            with PdfPages(path) as pdf:
+                for _ in self.frames(voltages, solver):
+                    pdf.savefig(self.figure)
+                    count += 1
+        elif extension in (".gif", ".mp4"):
+            from matplotlib import animation
+
+            writer = animation.PillowWriter(fps=fps) if extension == ".gif" else animation.FFMpegWriter(fps=fps)
+            with writer.saving(self.figure, path, self.figure.dpi):
+                for _ in self.frames(voltages, solver):
+                    writer.grab_frame()
+                    count += 1
+        else:
+            for _ in self.frames(voltages, solver):
+                self.figure.savefig(path.format(count))
+                count += 1
+        return count
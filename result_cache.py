@@ -0,0 +1,183 @@
+import contextlib
+import hashlib
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, writers are then only protected by the atomic replace
+    fcntl = None
+
+FORMAT_VERSION = 1
+
+# model attributes that mirror its domain state, which get_state() already covers
+STATE_ATTRIBUTES = ("_states", "states", "_index_stale", "_polarization", "_total", "interaction", "last_switched",
+                    "domains", "_index")
+
+
+def _hash_value(digest, value):
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        digest.update(f"array{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    elif isinstance(value, dict):
+        digest.update(f"dict{len(value)}".encode())
+        for name in sorted(value):
+            digest.update(repr(name).encode())
+            _hash_value(digest, value[name])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _hash_value(digest, item)
+    else:
+        digest.update(repr(value).encode())  # repr of floats round-trips exactly
+
+
+def _parameters(obj, skip=()):
+    """
+    :return: numeric, string and array attributes of obj
+    """
+    return {name: value for name, value in vars(obj).items()
+            if name not in skip and isinstance(value, (np.ndarray, np.generic, int, float, str, bool, tuple, list))}
+
+
+class ResultCache:
+    def __init__(self, root, max_bytes=2 ** 30):
+        """
+        Content-addressed on-disk cache of solve_sweep results. The key is a sha256 over everything that determines
+        a sweep: diode fingerprint (geometry and material parameters), the model's class, parameter arrays and
+        domain state, the waveform, and the solver settings and strategy. Entries are .npz files with the
+        polarizations and the final model state, written atomically, and the least recently used entries are
+        evicted once the cache exceeds max_bytes. Writers and eviction hold an flock on root/.lock, so several
+        processes can share one cache.
+        :param root: cache directory
+        :param max_bytes: size bound of all entries
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @contextlib.contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def key(self, solver, waveform):
+        """
+        :return: hex digest of the sweep of waveform (V) by solver from its current state
+        """
+        model = solver.ferroelectric
+        digest = hashlib.sha256(f"solve_sweep-v{FORMAT_VERSION}".encode())
+        _hash_value(digest, solver.potential.fed.fingerprint())
+        _hash_value(digest, type(model).__qualname__)
+        _hash_value(digest, _parameters(model, STATE_ATTRIBUTES))
+        _hash_value(digest, model.get_state())
+        _hash_value(digest, np.asarray(waveform, dtype=np.float64))
+        _hash_value(digest, (solver.max_iter, solver.threshold, type(solver.strategy).__qualname__,
+                             _parameters(solver.strategy)))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + ".npz")
+
+    def get(self, key):
+        """
+        :return: dict of the stored arrays, or None
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (zipfile.BadZipFile, EOFError, ValueError, OSError):
+            # truncated or corrupt entry, e.g. from a disk that filled up, counts as a miss and is rewritten
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+    def put(self, key, **arrays):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.savez(file, **arrays)
+                file.flush()
+                os.fsync(file.fileno())
+            with self._lock():
+                os.replace(tmp_path, path)
+                self._evict()
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+
+    def entries(self):
+        """
+        :return: (modification time, size, path) of every entry
+        """
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".npz"):
+                    path = os.path.join(directory, name)
+                    with contextlib.suppress(FileNotFoundError):
+                        stat = os.stat(path)
+                        entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def _evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+    def clear(self):
+        with self._lock():
+            for _, _, path in self.entries():
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+    def solve_sweep(self, solver, v_sweep, progress=True):
+        """
+        solver.solve_sweep(v_sweep) loaded from the cache when the same sweep was solved before. On a hit the model
+        and potential are left in the final state of the stored sweep, as if it had been solved.
+        :return: polarizations at each voltage
+        """
+        v_sweep = np.fromiter(v_sweep, dtype=float)
+        key = self.key(solver, v_sweep)
+        entry = self.get(key)
+        if entry is not None:
+            solver.ferroelectric.set_state({name[len("state_"):]: value for name, value in entry.items()
+                                            if name.startswith("state_")})
+            solver.potential.set_vdiff(float(entry["v_diff"]))
+            return list(entry["polarizations"])
+        polarizations = solver.solve_sweep(v_sweep, progress)
+        self.put(key, polarizations=np.asarray(polarizations, dtype=np.float64), v_diff=solver.potential.v_diff,
+                 **{"state_" + name: value for name, value in solver.ferroelectric.get_state().items()})
+        return polarizations
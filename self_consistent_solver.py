@@ -1,30 +1,430 @@
 from atomicunits import AtomicUnits
-from tqdm import tqdm
+from units import UnitArray, to_atomic, HARTREE_IN_EV, POLARIZATION_IN_UC_PER_CM2
+from streaming import NpyStreamWriter, save_checkpoint, load_checkpoint
+import itertools
+import os
+import warnings
+import numpy as np
+
+
+class FixedPointStrategy:
+    """
+    Plain fixed-point iteration: recompute the FE field from the current polarization and update the domains until
+    the polarization change drops below the solver threshold.
+    """
+
+    def solve(self, solver, v_diff):
+        """
+        :return: last polarization change, number of domain updates, whether the threshold was reached
+        """
+        threshold = solver.threshold_au
+        solver.set_vdiff(v_diff)
+        p_change = solver.update(solver.potential.total_e_field_fe)
+        for i in range(solver.max_iter):
+            if abs(p_change) <= threshold:
+                return p_change, i + 1, True
+            solver.set_vdiff(v_diff)  # recalculate E field in FE
+            p_change = solver.update(solver.potential.total_e_field_fe)
+        return p_change, solver.max_iter + 1, False
+
+
+class BracketingStrategy:
+    """
+    Finds the self-consistent switching field directly. The FE field is affine in the polarization and decreases as
+    domains switch along it, while switching is monotone in the applied field. If E0 is the field of the current
+    state, the residual f(E) = |E| - |field(P(E))| is therefore monotone on [0, E0], negative at 0 and non-negative
+    at E0. The strategy brackets its root with model.preview, which evaluates P(E) without switching, and then
+    applies the smallest consistent field once. Unlike fixed-point iteration it never switches domains that the
+    depolarization stops, so it cannot overshoot into a limit cycle.
+
+    Models that expose switching_fields() are bisected over their sorted coercive fields, which is exact in about
+    log2(N) previews. Other models (e.g. ContinuumFerroelectric) use Illinois regula falsi to rel_tol.
+    """
+
+    def __init__(self, rel_tol=1e-12, max_previews=200):
+        self.rel_tol = rel_tol
+        self.max_previews = max_previews
+
+    def solve(self, solver, v_diff):
+        """
+        :return: polarization change the field of the final state would still cause (the last switched change if
+        the iteration limit was reached), number of field evaluations, whether the threshold was reached
+        """
+        model = solver.ferroelectric
+        threshold = solver.threshold_au
+        iterations = 0
+        p_change = 0
+        for _ in range(solver.max_iter):
+            polarization = solver.avg_polarization()
+            e_fe = solver.fe_field(v_diff, polarization)
+            iterations += 1
+            remaining = solver.preview(e_fe)
+            if abs(remaining) <= threshold:
+                solver.set_vdiff(v_diff)
+                return remaining, iterations, True
+
+            sign = 1 if e_fe > 0 else -1
+
+            def residual(magnitude):
+                return magnitude - sign * solver.fe_field(v_diff, polarization + solver.preview(sign * magnitude))
+
+            fields = model.switching_fields() if hasattr(model, "switching_fields") else None
+            if fields is not None:
+                magnitude, previews = self._bisect(residual, fields, abs(e_fe))
+            else:
+                magnitude, previews = self._illinois(residual, abs(e_fe))
+            iterations += previews
+            p_change = solver.update(sign * magnitude)
+        solver.set_vdiff(v_diff)
+        return p_change, iterations, False
+
+    @staticmethod
+    def _bisect(residual, fields, magnitude):
+        lo = 0
+        hi = int(np.searchsorted(fields, magnitude, side="right")) - 1  # residual is non-negative at fields[hi]
+        previews = 0
+        while lo < hi:
+            mid = (lo + hi) // 2
+            previews += 1
+            if residual(fields[mid]) >= 0:
+                hi = mid
+            else:
+                lo = mid + 1
+        # the root lies in (fields[hi - 1], fields[hi]]. It is the jump at fields[hi] only if the field is still
+        # beyond fields[hi] with the domains up to fields[hi - 1] switched, otherwise fields[hi] must not switch.
+        if hi > 0:
+            previews += 1
+            if residual(fields[hi - 1]) + fields[hi] - fields[hi - 1] > 0:
+                return fields[hi - 1], previews
+        return fields[hi], previews
+
+    def _illinois(self, residual, magnitude):
+        lo, hi = 0.0, magnitude
+        f_lo, f_hi = -magnitude, residual(magnitude)
+        previews = 1
+        side = 0
+        while hi - lo > self.rel_tol * magnitude and previews < self.max_previews:
+            mid = hi - f_hi * (hi - lo) / (f_hi - f_lo) if f_hi != f_lo else 0.5 * (lo + hi)
+            if not lo < mid < hi:
+                mid = 0.5 * (lo + hi)
+            f_mid = residual(mid)
+            previews += 1
+            if f_mid >= 0:
+                hi, f_hi = mid, f_mid
+                if side == 1:
+                    f_lo /= 2
+                side = 1
+            else:
+                lo, f_lo = mid, f_mid
+                if side == -1:
+                    f_hi /= 2
+                side = -1
+        return hi, previews
+
+
+class EventSweep:
+    def __init__(self, waveform, segments, voltages, polarizations):
+        """
+        Piecewise-constant P(V) along a piecewise-linear voltage waveform, as returned by
+        SelfConsistentSolver.solve_events. Event i happens at voltages[i] in segment segments[i] (from waveform
+        point segments[i] - 1 to waveform point segments[i], segment 0 is the first point) and the polarization is
+        polarizations[i] from there up to the next event.
+        :param waveform: voltages (V) of the waveform points
+        """
+        self.waveform = np.asarray(waveform, dtype=float)
+        self.segments = np.asarray(segments, dtype=np.int64)
+        self.voltages = np.asarray(voltages, dtype=float)
+        self.polarizations = np.asarray(polarizations, dtype=float)
+        self.positions = self.path_positions(self.waveform)
+        # distance along the path of each event
+        self.event_positions = self.positions[np.maximum(self.segments - 1, 0)] + \
+            np.abs(self.voltages - self.waveform[np.maximum(self.segments - 1, 0)])
+
+    def __len__(self):
+        return len(self.voltages)
+
+    @staticmethod
+    def path_positions(waveform):
+        """
+        :return: distance (V) of each waveform point along the path, the cumulative sum of |dV|
+        """
+        return np.concatenate(([0.0], np.cumsum(np.abs(np.diff(waveform)))))
+
+    def at_waveform(self):
+        """
+        :return: polarization at every waveform point, what solve_sweep(waveform) returns for quasi-static
+        switching
+        """
+        return self.polarizations[np.searchsorted(self.segments, np.arange(len(self.waveform)), side="right") - 1]
+
+    def resample(self, positions):
+        """
+        :param positions: distances along the path (V), e.g. path_positions of a refined copy of the waveform
+        :return: polarization at each position
+        """
+        return self.polarizations[np.maximum(np.searchsorted(self.event_positions, positions, side="right") - 1, 0)]
+
+
 class SelfConsistentSolver:
-    def __init__(self, ferroelectric, potential, max_iter=500, threshold=0.5):
-        self.ferroelectric = ferroelectric
-        self.potential = potential
+    def __init__(self, ferroelectric, potential, max_iter=500, threshold=0.5, strategy=None, instrument=None):
+        """
+        :param strategy: self-consistency strategy, FixedPointStrategy by default
+        :param instrument: optional instrumentation.SolverInstrument receiving per-voltage records
+        """
+        self._ferroelectric = ferroelectric
+        self._potential = potential
         self.max_iter = max_iter
         self.threshold = threshold
+        self.strategy = FixedPointStrategy() if strategy is None else strategy
+        self.iterations = 0
+        self.set_instrument(instrument)
+
+    @property
+    def ferroelectric(self):
+        return self._ferroelectric
+
+    @ferroelectric.setter
+    def ferroelectric(self, ferroelectric):
+        self._ferroelectric = ferroelectric
+        self.set_instrument(self.instrument)  # rebind the model calls
+
+    @property
+    def potential(self):
+        return self._potential
+
+    @potential.setter
+    def potential(self, potential):
+        self._potential = potential
+        self.set_instrument(self.instrument)  # rebind the potential calls
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, threshold):
+        self._threshold = threshold
+        self.threshold_au = threshold / POLARIZATION_IN_UC_PER_CM2
+
+    def set_instrument(self, instrument):
+        """
+        Binds the model and potential calls used by the strategies, wrapped with timers if instrument is not None.
+        """
+        self.instrument = instrument
+        model, potential = self.ferroelectric, self.potential
+        self.set_vdiff = potential.set_vdiff
+        self.fe_field = potential.fe_field
+        self.update = model.update
+        self.avg_polarization = model.avg_polarization
+        self.preview = getattr(model, "preview", None)
+        if instrument is not None:
+            self.set_vdiff = instrument.timed("set_vdiff", self.set_vdiff)
+            self.fe_field = instrument.timed("fe_field", self.fe_field)
+            self.update = instrument.timed_update(model, AtomicUnits.convert_back_polarization)
+            self.avg_polarization = instrument.timed("avg_polarization", self.avg_polarization)
+            if self.preview is not None:
+                self.preview = instrument.timed("preview", self.preview)
 
     def solve(self, voltage):
-        self.potential.set_vdiff(AtomicUnits.convert_volts(voltage))
-        e_fe = self.potential.total_e_field_fe
-        p_change = self.ferroelectric.update(e_fe)
-        for i in range(self.max_iter):
-            if abs(p_change) <= AtomicUnits.convert_polarization(self.threshold):
-                return self.ferroelectric.avg_polarization(), AtomicUnits.convert_back_polarization(p_change)
-            else:
-                self.potential.set_vdiff(AtomicUnits.convert_volts(voltage)) # recalculate E field in FE
-                e_fe = self.potential.total_e_field_fe
-                p_change = self.ferroelectric.update(e_fe)
-        print(f"Simulation for {voltage} did not converge in specified iteration limits.")
-        return self.ferroelectric.avg_polarization(), AtomicUnits.convert_back_polarization(p_change)
+        return self._solve(AtomicUnits.convert_volts(voltage), voltage)
+
+    def _solve(self, v_diff, voltage):
+        """
+        :param v_diff: applied voltage in atomic units
+        :param voltage: the same voltage in V, for reporting
+        """
+        if self.instrument is None:
+            p_change, self.iterations, converged = self.strategy.solve(self, v_diff)
+        else:
+            self.instrument.begin(voltage)
+            p_change, self.iterations, converged = self.strategy.solve(self, v_diff)
+            self.instrument.end(self.iterations, converged, p_change * POLARIZATION_IN_UC_PER_CM2)
+        if not converged:
+            warnings.warn(f"Simulation for {voltage} did not converge in specified iteration limits.",
+                          RuntimeWarning, stacklevel=3)
+        return self.ferroelectric.avg_polarization(), p_change * POLARIZATION_IN_UC_PER_CM2
+
+    def solve_sweep(self, v_sweep, progress=True):
+        """
+        :param v_sweep: voltages in V, or a units.UnitArray in any potential unit, converted to atomic units once
+        """
+        from tqdm import tqdm
 
-    def solve_sweep(self, v_sweep):
+        if isinstance(v_sweep, UnitArray):
+            v_diffs = v_sweep.to_atomic()
+            v_sweep = v_sweep.to("V")
+        else:
+            v_sweep = np.fromiter(v_sweep, dtype=float)
+            v_diffs = to_atomic(v_sweep, "V")
         polarizations = []
-        for v in (pbar := tqdm(v_sweep)):
-            p, acc = self.solve(v)
+        for v_diff, v in zip(v_diffs.tolist(), (pbar := tqdm(v_sweep.tolist(), disable=not progress))):
+            p, acc = self._solve(v_diff, v)
             polarizations.append(p)
             pbar.set_postfix_str(f"Accuracy: {acc} uc/cm^2")
         return polarizations
+
+    def solve_events(self, waveform, max_events=None):
+        """
+        Event-driven sweep along the piecewise-linear waveform. For a fixed polarization the FE field is affine in
+        the applied voltage and no domain switches while it stays between the model's next_thresholds(), so each
+        segment is advanced analytically to the voltage where the field reaches the next coercive field. The
+        solver only runs there, nudged with nextafter until the field has crossed it. Events are solved with a zero
+        threshold, so every crossed coercive field switches its domain. The result is exact for quasi-static
+        switching as solved by BracketingStrategy, it equals solve_sweep with threshold 0 at the waveform points.
+        Other strategies are used as given. The cost grows with the number of events, not of waveform points.
+        The model must provide next_thresholds() (Ferroelectric, HistogramFerroelectric, LatticeFerroelectric).
+        ContinuumFerroelectric switches continuously and has no discrete events.
+        :param waveform: voltages (V) of the waveform points
+        :param max_events: optional limit of events per monotone leg of the waveform
+        :return: EventSweep
+        """
+        if not hasattr(self.ferroelectric, "next_thresholds"):
+            raise TypeError(f"solve_events needs a model with next_thresholds(), "
+                            f"{type(self.ferroelectric).__name__} has none")
+        threshold = self.threshold
+        self.threshold = 0
+        try:
+            return self._solve_events(np.fromiter(waveform, dtype=float), max_events)
+        finally:
+            self.threshold = threshold
+
+    def _solve_events(self, waveform, max_events):
+        model = self.ferroelectric
+        waveform_au = to_atomic(waveform, "V")
+        p, _ = self._solve(waveform_au[0], waveform[0])
+        segments, voltages, polarizations = [0], [waveform[0]], [p]
+
+        # monotone legs between turning points, each advanced as one piece
+        steps = np.sign(np.diff(waveform_au))
+        moving = np.flatnonzero(steps)
+        turns = moving[1:][steps[moving[1:]] != steps[moving[:-1]]].tolist()
+        for first, last in zip([0] + turns, turns + [len(waveform) - 1]):
+            v_diff, target = waveform_au[first], waveform_au[last]
+            direction = np.sign(target - v_diff)
+            points = direction * waveform_au[first:last + 1]  # non-decreasing along the leg
+            events = 0
+            while direction != 0 and (max_events is None or events < max_events):
+                polarization = self.avg_polarization()
+                up, down = model.next_thresholds()
+                e_start = self.fe_field(v_diff, polarization)
+                slope = (self.fe_field(target, polarization) - e_start) / (target - v_diff)
+                threshold = up if slope * direction > 0 else down
+                if slope == 0 or not np.isfinite(threshold):
+                    break
+                v_event = v_diff + (threshold - e_start) / slope
+                if direction * (v_event - v_diff) <= 0:
+                    v_event = np.nextafter(v_diff, target)
+                while (self.fe_field(v_event, polarization) - threshold) * slope * direction < 0 and \
+                        direction * (target - v_event) > 0:
+                    v_event = np.nextafter(v_event, target)
+                if direction * (v_event - target) > 0 or \
+                        (self.fe_field(v_event, polarization) - threshold) * slope * direction < 0:
+                    break  # no switching before the end of the leg
+                voltage = float(v_event * HARTREE_IN_EV)
+                p, _ = self._solve(v_event, voltage)
+                segments.append(first + max(int(np.searchsorted(points, direction * v_event, side="left")), 1))
+                voltages.append(voltage)
+                polarizations.append(p)
+                v_diff = v_event
+                events += 1
+                if p == polarization and model.next_thresholds() == (up, down):
+                    # nothing switched at the threshold, e.g. a lattice avalanche that cycled back. Continue from the
+                    # next waveform point instead of creeping along the threshold.
+                    following = first + int(np.searchsorted(points, direction * v_event, side="right"))
+                    if following > last:
+                        break
+                    v_diff = waveform_au[following]
+                    p, _ = self._solve(v_diff, float(waveform[following]))
+                    segments.append(following)
+                    voltages.append(float(waveform[following]))
+                    polarizations.append(p)
+                    events += 1
+        self.set_vdiff(waveform_au[-1])
+        return EventSweep(waveform, segments, voltages, polarizations)
+
+    def solve_stream(self, voltages, output=None, chunk_size=4096, checkpoint=None, checkpoint_every=100000,
+                     resume=False):
+        """
+        Lazily solves an iterable or generator of voltages, with memory independent of its length.
+        :param output: optional .npy path, polarization, residual (uc/cm^2) and iteration count of every point are
+        written to it in chunks of chunk_size records
+        :param checkpoint: optional .npz path for the ferroelectric state, written every checkpoint_every points
+        :param resume: continue from checkpoint if it exists. The first points of voltages, already completed by the
+        killed run, are skipped and output is truncated to the checkpointed point.
+        :return: generator of (polarization, residual, iterations) for each solved point
+        """
+        start = 0
+        if resume and checkpoint is not None and os.path.exists(checkpoint):
+            start, v_diff, model_state = load_checkpoint(checkpoint)
+            self.ferroelectric.set_state(model_state)
+            self.potential.set_vdiff(v_diff)
+        if output is not None:
+            writer = NpyStreamWriter(output, chunk_size=chunk_size, resume_count=start if start else None)
+        else:
+            writer = None
+        try:
+            for count, v in enumerate(itertools.islice(voltages, start, None), start=start + 1):
+                p, acc = self.solve(v)
+                if writer is not None:
+                    writer.append((p, acc, self.iterations))
+                if checkpoint is not None and count % checkpoint_every == 0:
+                    if writer is not None:
+                        writer.flush()
+                    save_checkpoint(checkpoint, count, self.potential.v_diff, self.ferroelectric.get_state())
+                yield p, acc, self.iterations
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+class EnsembleSolver:
+    def __init__(self, ensemble, potential, max_iter=500, threshold=0.5):
+        """
+        Solves every realization of a preisach.FerroelectricEnsemble at once. Each realization sees its own FE
+        field, evaluated in closed form from its polarization with potential.fe_field.
+        :param ensemble: preisach.FerroelectricEnsemble
+        :param potential: Potential of the diode shared by all realizations
+        """
+        self.ensemble = ensemble
+        self.potential = potential
+        self.max_iter = max_iter
+        self.threshold = threshold
+
+    def solve(self, voltage):
+        v_diff = AtomicUnits.convert_volts(voltage)
+        threshold = self.threshold / POLARIZATION_IN_UC_PER_CM2
+        e_fe = self.potential.fe_field(v_diff, self.ensemble.avg_polarization())
+        p_change = self.ensemble.update(e_fe)
+        active = np.flatnonzero(np.abs(p_change) > threshold)
+        for i in range(self.max_iter):
+            if len(active) == 0:
+                break
+            e_fe = self.potential.fe_field(v_diff, self.ensemble.avg_polarization()[active])
+            p_change[active] = self.ensemble.update(e_fe, rows=active)
+            active = active[np.abs(p_change[active]) > threshold]
+        if len(active) > 0:
+            warnings.warn(f"Simulation for {voltage} did not converge in specified iteration limits for "
+                          f"{len(active)} realizations.", RuntimeWarning, stacklevel=2)
+        return self.ensemble.avg_polarization(), p_change * POLARIZATION_IN_UC_PER_CM2
+
+    def solve_sweep(self, v_sweep, keep_loops=True, progress=True):
+        """
+        :param keep_loops: if False only the running statistics are kept
+        :param progress: show a progress bar
+        :return: per-realization P-V loops of shape (len(v_sweep), R) or None, and the mean and variance over
+        realizations at each voltage
+        """
+        from tqdm import tqdm
+
+        v_sweep = np.asarray(v_sweep, dtype=float)
+        loops = np.empty((len(v_sweep), self.ensemble.num_realizations)) if keep_loops else None
+        mean = np.empty(len(v_sweep))
+        variance = np.empty(len(v_sweep))
+        for i, v in enumerate(pbar := tqdm(v_sweep, disable=not progress)):
+            p, acc = self.solve(v)
+            if keep_loops:
+                loops[i] = p
+            mean[i] = p.mean()
+            variance[i] = p.var()
+            pbar.set_postfix_str(f"Max accuracy: {np.abs(acc).max()} uc/cm^2")
+        return loops, mean, variance
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([("polarization", "<f8"), ("residual", "<f8"), ("iterations", "<i8")])
+
+
+class NpyStreamWriter:
+    HEADER_SIZE = 256
+
+    def __init__(self, path, dtype=RECORD_DTYPE, chunk_size=4096, resume_count=None):
+        """
+        Appends records to a 1-D .npy file in chunks. The header is rewritten after every chunk, so the file is a
+        valid array that np.load(path, mmap_mode="r") can map at any time, and memory stays at one chunk.
+        :param resume_count: if given, reopen an existing file and keep only its first resume_count records
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._buffer = np.empty(chunk_size, dtype=self.dtype)
+        self._fill = 0
+        if resume_count is None:
+            self._file = open(path, "w+b")
+            self.count = 0
+        else:
+            self._file = open(path, "r+b")
+            self.count = resume_count
+            self._file.truncate(self.HEADER_SIZE + resume_count * self.dtype.itemsize)
+        self._write_header()
+
+    def _write_header(self):
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+            np.lib.format.dtype_to_descr(self.dtype), self.count)
+        prefix = np.lib.format.magic(1, 0)
+        header_len = self.HEADER_SIZE - len(prefix) - 2
+        header = header.ljust(header_len - 1) + "\n"
+        if len(header) != header_len:
+            raise ValueError("record dtype does not fit in the reserved .npy header")
+        self._file.seek(0)
+        self._file.write(prefix + header_len.to_bytes(2, "little") + header.encode("latin1"))
+
+    def append(self, record):
+        self._buffer[self._fill] = record
+        self._fill += 1
+        if self._fill == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        if self._fill:
+            self._file.seek(self.HEADER_SIZE + self.count * self.dtype.itemsize)
+            self._file.write(self._buffer[:self._fill].tobytes())
+            self.count += self._fill
+            self._fill = 0
+            self._write_header()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def save_checkpoint(path, count, v_diff, model_state):
+    """
+    Atomically writes the number of completed points, the applied voltage and the ferroelectric state.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez(file, count=count, v_diff=v_diff, **{"state_" + name: value for name, value in model_state.items()})
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """
+    :return: number of completed points, applied voltage and ferroelectric state of a checkpoint
+    """
+    with np.load(path) as checkpoint:
+        model_state = {name[len("state_"):]: checkpoint[name] for name in checkpoint.files if name.startswith("state_")}
+        return int(checkpoint["count"]), float(checkpoint["v_diff"]), model_state
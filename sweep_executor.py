@@ -0,0 +1,120 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from fed import FerroelectricDiode
+from materials import Materials
+from potential import Potential
+from preisach import Ferroelectric
+from self_consistent_solver import SelfConsistentSolver
+
+
+def parameter_grid(**axes):
+    """
+    Cartesian product of sweep axes, e.g. parameter_grid(insulator_thickness=[10, 20], insulator=["al2o3", "hfo2"]).
+    Material axes take attribute names of materials.Materials or material objects.
+    :return: list of grid points, the last axis varies fastest
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def _material(material):
+    return getattr(Materials, material) if isinstance(material, str) else material
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 always registers the segment with the resource tracker
+        return shared_memory.SharedMemory(name=name)
+
+
+def _run_point(task):
+    point, v_sweep, ferroelectric_params, seed_sequence, shared, max_iter, threshold = task
+    if shared is None:
+        ferroelectric = Ferroelectric(**ferroelectric_params, rng=np.random.default_rng(seed_sequence))
+    else:
+        name, num_domains = shared
+        shm = _attach(name)
+        try:
+            domains = np.ndarray((2, num_domains), dtype=np.float64, buffer=shm.buf)
+            ferroelectric = Ferroelectric.from_arrays(p_s_values=domains[0].copy(), e_c_values=domains[1].copy())
+            del domains
+        finally:
+            shm.close()
+
+    fed = FerroelectricDiode(insulator_thickness=point["insulator_thickness"],
+                             fe_thickness=point["fe_thickness"],
+                             dead_layer_thickness=point["dead_layer_thickness"],
+                             top_electrode=_material(point["top_electrode"]),
+                             bottom_electrode=_material(point["bottom_electrode"]),
+                             insulator=_material(point["insulator"]),
+                             ferroelectric=_material(point["ferroelectric"]),
+                             fe_model=ferroelectric)
+    solver = SelfConsistentSolver(ferroelectric, Potential(fed, 0), max_iter=max_iter, threshold=threshold)
+    return np.array(solver.solve_sweep(v_sweep, progress=False))
+
+
+class SweepExecutor:
+    def __init__(self,
+                 v_sweep,
+                 ferroelectric_params,
+                 device=None,
+                 max_workers=None,
+                 seed=0,
+                 shared_domains=False,
+                 max_iter=500,
+                 threshold=0.5):
+        """
+        Runs SelfConsistentSolver.solve_sweep over a grid of devices on a process pool.
+        :param v_sweep: voltage waveform applied at every grid point
+        :param ferroelectric_params: keyword arguments of preisach.Ferroelectric, without seed or rng
+        :param device: default FerroelectricDiode arguments, overridden by the keys of each grid point. Material
+        entries take attribute names of materials.Materials or material objects.
+        :param max_workers: number of worker processes, None uses the number of CPUs
+        :param seed: root seed. Each grid point draws its domains from its own np.random.Generator stream spawned
+        from it, so results do not depend on the worker count or on scheduling.
+        :param shared_domains: if True one domain ensemble is sampled from seed and reused at every grid point
+        (common random numbers). The ensemble is placed in shared memory instead of being pickled to each worker.
+        """
+        self.v_sweep = np.asarray(v_sweep, dtype=float)
+        self.ferroelectric_params = dict(ferroelectric_params)
+        self.device = dict(device or {})
+        self.max_workers = max_workers
+        self.seed = seed
+        self.shared_domains = shared_domains
+        self.max_iter = max_iter
+        self.threshold = threshold
+
+    def run(self, grid):
+        """
+        :param grid: list of grid points, e.g. from parameter_grid
+        :return: array of shape (len(grid), len(v_sweep)) of average FE polarizations, in grid order
+        """
+        points = [{**self.device, **point} for point in grid]
+        seed_sequences = np.random.SeedSequence(self.seed).spawn(len(points))
+        shm = None
+        shared = None
+        try:
+            if self.shared_domains:
+                template = Ferroelectric(**self.ferroelectric_params, rng=np.random.default_rng(self.seed))
+                num_domains = len(template.e_c_values)
+                shm = shared_memory.SharedMemory(create=True, size=max(2 * num_domains * 8, 1))
+                domains = np.ndarray((2, num_domains), dtype=np.float64, buffer=shm.buf)
+                domains[0] = template.p_s_values
+                domains[1] = template.e_c_values
+                del domains, template
+                shared = (shm.name, num_domains)
+
+            tasks = [(point, self.v_sweep, self.ferroelectric_params, seed_sequence, shared, self.max_iter,
+                      self.threshold) for point, seed_sequence in zip(points, seed_sequences)]
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(_run_point, tasks))
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        return np.array(results).reshape(len(points), len(self.v_sweep))
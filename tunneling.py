@@ -0,0 +1,127 @@
+import numpy as np
+from atomicunits import AtomicUnits
+from mesh import adaptive_mesh
+
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz  # np.trapz was renamed in NumPy 2.0
+
+
+def wkb_transmission(profile, m_eff, x, energies):
+    """
+    WKB transmission through a potential energy profile, evaluated on an energy x position grid.
+    :param profile: potential energy at positions x
+    :param m_eff: effective mass at positions x
+    :param x: positions, increasing
+    :param energies: longitudinal electron energies
+    :return: transmission probability at each energy
+    """
+    energies = np.asarray(energies, dtype=float)
+    kappa = np.sqrt(2 * m_eff * np.maximum(profile[None, :] - energies[:, None], 0))
+    return np.exp(-2 * _trapezoid(kappa, x, axis=1))
+
+
+def supply_function(energies, mu_left, mu_right, kt):
+    """
+    Tsu-Esaki supply function ln[(1 + exp((mu_left - E) / kT)) / (1 + exp((mu_right - E) / kT))] for electrons
+    flowing from left to right.
+    """
+    energies = np.asarray(energies, dtype=float)
+    return np.logaddexp(0, (mu_left - energies) / kt) - np.logaddexp(0, (mu_right - energies) / kt)
+
+
+def on_off_ratio(j_on, j_off):
+    return np.abs(np.asarray(j_on)) / np.abs(np.asarray(j_off))
+
+
+class TunnelingCurrent:
+    def __init__(self,
+                 potential,
+                 temperature=300,
+                 num_energies=1000,
+                 num_positions=2000,
+                 x=None,
+                 energy_window=40,
+                 chunk_size=256,
+                 mesh_tolerance=None):
+        """
+        Tunneling current density through a ferroelectric diode, using WKB transmission and Fermi-Dirac supply
+        functions of the two electrodes. Positive currents are electrons flowing from the top to the bottom
+        electrode. All quantities are in atomic units.
+        :param potential: Potential of the diode, its current set_vdiff state is used
+        :param temperature: electrode temperature in K
+        :param num_energies: number of points of the energy integral
+        :param num_positions: number of points of the WKB integral, ignored if x is given
+        :param x: optional position grid for the WKB integral
+        :param energy_window: energies up to this many kT above the higher Fermi level are integrated
+        :param chunk_size: energies evaluated per array operation, bounds the memory of the energy x position grid
+        :param mesh_tolerance: if given and x is None, the WKB integral uses mesh.adaptive_mesh with this tolerance
+        in the screening tails and a step of 1 / num_positions of the device inside the layers
+        """
+        self.potential = potential
+        self.kt = AtomicUnits.k_b * temperature
+        self.num_energies = num_energies
+        self.num_positions = num_positions
+        self.x = None if x is None else np.asarray(x, dtype=float)
+        self.energy_window = energy_window
+        self.chunk_size = chunk_size
+        self.mesh_tolerance = mesh_tolerance
+
+    def positions(self):
+        if self.x is not None:
+            return self.x
+        boundaries = self.potential.layer_boundaries
+        if self.mesh_tolerance is not None:
+            return adaptive_mesh(self.potential.layer_stack, self.mesh_tolerance,
+                                 layer_step=(boundaries[-1] - boundaries[0]) / self.num_positions)
+        return np.linspace(boundaries[0], boundaries[-1], self.num_positions)
+
+    def fermi_levels(self):
+        """
+        :return: Fermi levels of the top and bottom electrode, measured from the top electrode band bottom
+        """
+        fed = self.potential.fed
+        return fed.top_fermi_e, fed.top_fermi_e + self.potential.v_diff
+
+    def energies(self):
+        fed = self.potential.fed
+        mu_top, mu_bottom = self.fermi_levels()
+        lowest = max(0, mu_bottom - fed.bottom_fermi_e)  # states must exist in both electrodes
+        return np.linspace(lowest, max(mu_top, mu_bottom) + self.energy_window * self.kt, self.num_energies)
+
+    def transmission(self, energies=None):
+        """
+        :return: energies and WKB transmission at the current potential state
+        """
+        energies = self.energies() if energies is None else np.asarray(energies, dtype=float)
+        x = self.positions()
+        profile = self.potential.total_potential_profile(x)
+        m_eff = self.potential.fed.m_eff(x)
+        transmission = np.empty(len(energies))
+        for start in range(0, len(energies), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            transmission[chunk] = wkb_transmission(profile, m_eff, x, energies[chunk])
+        return energies, transmission
+
+    def current_density(self):
+        energies, transmission = self.transmission()
+        mu_top, mu_bottom = self.fermi_levels()
+        m_eff = self.potential.fed.top_m_eff
+        integrand = transmission * supply_function(energies, mu_top, mu_bottom, self.kt)
+        return m_eff * self.kt / (2 * np.pi ** 2) * _trapezoid(integrand, energies)
+
+    def iv_curve(self, solver, v_sweep):
+        """
+        Solves the polarization at each voltage and evaluates the current at the resulting state.
+        :param solver: SelfConsistentSolver sharing this object's potential. If the potential is a
+        potential_cache.PotentialCache, currents of repeated states are taken from its cache.
+        :param v_sweep: voltages in V
+        :return: average FE polarizations and current densities in uA/um^2
+        """
+        cached_current = getattr(self.potential, "current_density", None)  # potential_cache.PotentialCache
+        polarizations = np.empty(len(v_sweep))
+        currents = np.empty(len(v_sweep))
+        for i, v in enumerate(v_sweep):
+            polarizations[i], _ = solver.solve(v)
+            self.potential.set_vdiff(AtomicUnits.convert_volts(v))
+            current = self.current_density() if cached_current is None else cached_current(self)
+            currents[i] = AtomicUnits.convert_current_density(current)
+        return polarizations, currents
@@ -0,0 +1,97 @@
+import numpy as np
+
+# Size of the atomic unit of each quantity expressed in conventional units, e.g. 1 hartree = HARTREE_IN_EV eV.
+HARTREE_IN_EV = 27.21138624598853
+HARTREE_IN_J = 4.359744722207185e-18
+BOHR_IN_NM = 5.2917721090380e-2
+BOHR_IN_M = 5.2917721090380e-11
+POLARIZATION_IN_UC_PER_CM2 = 1.602176634e-13 / 5.291772109038e-9 ** 2
+E_FIELD_IN_MV_PER_CM = 5.1422067476378 * 10 ** 3
+DENSITY_IN_PER_M3 = 1 / 5.2917721090380e-11 ** 3
+CURRENT_DENSITY_IN_UA_PER_UM2 = 6.62361823751013e3 / 5.291772109038e-5 ** 2
+
+ATOMIC = "au"
+
+# unit -> (dimension, size of the atomic unit in that unit)
+UNITS = {
+    "hartree": ("energy", 1.0),
+    "eV": ("energy", HARTREE_IN_EV),
+    "J": ("energy", HARTREE_IN_J),
+    "V": ("potential", HARTREE_IN_EV),
+    "bohr": ("length", 1.0),
+    "nm": ("length", BOHR_IN_NM),
+    "m": ("length", BOHR_IN_M),
+    "uC/cm^2": ("polarization", POLARIZATION_IN_UC_PER_CM2),
+    "C/m^2": ("polarization", POLARIZATION_IN_UC_PER_CM2 / 1e2),
+    "MV/cm": ("e_field", E_FIELD_IN_MV_PER_CM),
+    "m^-3": ("density", DENSITY_IN_PER_M3),
+    "uA/um^2": ("current_density", CURRENT_DENSITY_IN_UA_PER_UM2),
+}
+
+
+def _size(unit):
+    if unit == ATOMIC:
+        return 1.0
+    try:
+        return UNITS[unit][1]
+    except KeyError:
+        raise ValueError(f"Unknown unit {unit!r}, expected {ATOMIC!r} or one of {', '.join(UNITS)}") from None
+
+
+def to_atomic(values, unit, out=None):
+    """
+    Converts values given in unit to atomic units.
+    :param values: scalar or array
+    :param out: optional array receiving the result, pass values itself to convert a float array in place
+    """
+    if out is None:
+        return values / _size(unit)
+    return np.divide(values, _size(unit), out=out)
+
+
+def from_atomic(values, unit, out=None):
+    """
+    Converts values given in atomic units to unit.
+    :param out: optional array receiving the result, pass values itself to convert a float array in place
+    """
+    if out is None:
+        return values * _size(unit)
+    return np.multiply(values, _size(unit), out=out)
+
+
+class UnitArray(np.ndarray):
+    """
+    Float array tagged with the unit of its values. The tag is carried through views, slices and elementwise
+    results, it is a label for conversions on entry and exit and not dimensional analysis.
+    """
+
+    def __new__(cls, values, unit, copy=True):
+        _size(unit)
+        array = np.array(values, dtype=float, copy=copy).view(cls)
+        array.unit = unit
+        return array
+
+    def __array_finalize__(self, array):
+        self.unit = getattr(array, "unit", ATOMIC)
+
+    def to(self, unit, inplace=False):
+        """
+        :param unit: target unit, of the same dimension as self.unit, or "au"
+        :param inplace: convert the data of self instead of a copy
+        """
+        if self.unit != ATOMIC and unit != ATOMIC and UNITS[self.unit][0] != UNITS[unit][0]:
+            raise ValueError(f"Cannot convert {UNITS[self.unit][0]} in {self.unit} to "
+                             f"{UNITS[unit][0]} in {unit}")
+        result = self if inplace else self.copy()
+        if self.unit != ATOMIC:
+            to_atomic(result, self.unit, out=result)
+        if unit != ATOMIC:
+            from_atomic(result, unit, out=result)
+        result.unit = unit
+        return result
+
+    def to_atomic(self, inplace=False):
+        return self.to(ATOMIC, inplace)
+
+    def __repr__(self):
+        return f"{np.asarray(self)!r} {self.unit}"